@@ -0,0 +1,254 @@
+""" Microbenchmarks for model building and action planning.
+
+    Generates synthetic GraphQL payloads and configs, then measures the time
+    and peak allocations of each CPU-bound stage.  Results are written as JSON
+    so that runs can be compared, eg:
+
+      python -m ghadm.bench --scale realistic --output before.json
+      python -m ghadm.bench --scale realistic --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from ghadm.client import Repository, Issue
+import ghadm.labels as labels
+
+SCALES = {
+    'realistic': {
+        'labels': 200,
+        'issues': 5000,
+        'labels_per_issue': 3,
+        'config_labels': 50,
+        'synonyms_per_label': 2,
+        'repos': 20
+    },
+    'extreme': {
+        'labels': 10000,
+        'issues': 200000,
+        'labels_per_issue': 5,
+        'config_labels': 500,
+        'synonyms_per_label': 3,
+        'repos': 200
+    }
+}
+
+class Stage:
+    def __init__(self, name: str, seconds: float, peak_bytes: int):
+        self.name = name
+        self.seconds = seconds
+        self.peak_bytes = peak_bytes
+
+    def __repr__(self):
+        return 'Stage<{}, {}, {}>'.format(
+            repr(self.name),
+            repr(self.seconds),
+            repr(self.peak_bytes))
+
+
+def labelNodes(count: int) -> list[dict]:
+    return [
+        {
+            'id': 'label_id_{}'.format(n),
+            'name': 'Label {}'.format(n),
+            'color': '{:06X}'.format(n % 0xFFFFFF),
+            'description': 'description {}'.format(n)
+        }
+        for n in range(count)]
+
+
+def issueNodes(count: int, label_count: int, labels_per_issue: int) -> list[dict]:
+    return [
+        {
+            'id': 'issue_id_{}'.format(n),
+            'title': 'Issue {}'.format(n),
+            'labels': {
+                'nodes': [
+                    {'id': 'label_id_{}'.format((n * 7 + l * 13) % label_count)}
+                    for l in range(labels_per_issue)],
+                'pageInfo': {'hasNextPage': False}
+            }
+        }
+        for n in range(count)]
+
+
+def repositoryGraph(scale: dict) -> dict:
+    """ Returns a payload shaped like the result of Client.Repository. """
+    return {
+        'repository': {
+            'id': 'repo_id',
+            'name': 'repo',
+            'labels': {'nodes': labelNodes(scale['labels'])},
+            'issues': {
+                'nodes': issueNodes(
+                    scale['issues'], scale['labels'], scale['labels_per_issue'])
+            }
+        }
+    }
+
+
+def syncConfig(scale: dict) -> dict:
+    """ Returns a config which edits, creates and merges synonyms.
+
+        Configured labels overlap the synthetic labels with different case and
+        colour, and synonyms are drawn from the synthetic labels.
+    """
+    cfg_labels = {}
+    for n in range(scale['config_labels']):
+        cfg_labels['LABEL {}'.format(n * 2)] = {
+            'color': '000000',
+            'description': 'configured {}'.format(n),
+            'synonyms': [
+                'label {}'.format(n * 2 + 1 + s * 2 * scale['config_labels'])
+                for s in range(scale['synonyms_per_label'])]
+        }
+
+    return {
+        'organization': 'org',
+        'project_repos': ['repo'],
+        'labels': cfg_labels
+    }
+
+
+def measure(name: str, fn, repeat: int, setup=None) -> Stage:
+    """ Runs fn repeat times, returning the best time and the peak allocations.
+
+        If setup is given its result is passed to fn, and it is excluded from
+        both the timing and the allocation peak.
+    """
+    setup = setup or (lambda: None)
+
+    best = None
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        fn(arg)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    arg = setup()
+    tracemalloc.start()
+    fn(arg)
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Stage(name, best, peak)
+
+
+def Run(scale_name: str, repeat: int) -> list[Stage]:
+    """ Runs every stage at the given scale. """
+    scale = SCALES[scale_name]
+    graph = repositoryGraph(scale)
+    config = syncConfig(scale)
+
+    def fromGraphQL(_):
+        return Repository.FromGraphQL(graph)
+
+    def issueDictFromNodes(_):
+        return Issue.DictFromNodes(graph['repository']['issues']['nodes'])
+
+    def labelsByLowerName(repo):
+        return repo.LabelsByLowerName()
+
+    def generateSyncActions(repo):
+        return labels.GenerateSyncActions(config, repo)
+
+    repo_labels = Repository.FromGraphQL(graph).labels
+    repos = {
+        'repo_{}'.format(n): Repository(
+            'repo_id_{}'.format(n), 'repo_{}'.format(n), repo_labels, {}, [])
+        for n in range(scale['repos'])}
+
+    def matchRepositories(_):
+        return labels.matchRepositories(repos, 'label 1[0-9]')
+
+    def newRepository():
+        return Repository.FromGraphQL(graph)
+
+    stages = [
+        ('Repository.FromGraphQL', fromGraphQL, None),
+        ('Issue.DictFromNodes', issueDictFromNodes, None),
+        ('LabelsByLowerName', labelsByLowerName, newRepository),
+        ('GenerateSyncActions', generateSyncActions, newRepository),
+        ('matchRepositories', matchRepositories, None)
+    ]
+
+    results = []
+    for (name, fn, setup) in stages:
+        print('Running {}...'.format(name), end='', file=sys.stderr)
+        sys.stderr.flush()
+        results.append(measure(name, fn, repeat, setup))
+        print(' done', file=sys.stderr)
+
+    return results
+
+
+def report(scale_name: str, stages: list[Stage]) -> dict:
+    return {
+        'scale': scale_name,
+        'parameters': SCALES[scale_name],
+        'python': platform.python_version(),
+        'stages': {
+            s.name: {'seconds': s.seconds, 'peak_bytes': s.peak_bytes}
+            for s in stages}
+    }
+
+
+def printComparison(current: dict, baseline: dict):
+    print('{:<24} {:>12} {:>12} {:>8} {:>14} {:>14} {:>8}'.format(
+        'stage', 'base (s)', 'now (s)', 'ratio', 'base peak', 'now peak', 'ratio'))
+
+    for name in current['stages']:
+        now = current['stages'][name]
+        base = baseline['stages'].get(name)
+        if not base:
+            continue
+
+        print('{:<24} {:>12.4f} {:>12.4f} {:>8.2f} {:>14} {:>14} {:>8.2f}'.format(
+            name,
+            base['seconds'],
+            now['seconds'],
+            now['seconds'] / base['seconds'] if base['seconds'] else 0,
+            base['peak_bytes'],
+            now['peak_bytes'],
+            now['peak_bytes'] / base['peak_bytes'] if base['peak_bytes'] else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m ghadm.bench',
+        description='microbenchmarks for model building and action planning')
+    parser.add_argument(
+        '-s', '--scale', choices=sorted(SCALES), default='realistic',
+        help='size of the synthetic payloads')
+    parser.add_argument(
+        '-n', '--repeat', type=int, default=3,
+        help='number of timed runs per stage, the fastest is reported')
+    parser.add_argument(
+        '-o', '--output', metavar='FILE',
+        help='write results as JSON to FILE')
+    parser.add_argument(
+        '-c', '--compare', metavar='FILE',
+        help='compare results with a previous JSON output')
+    args = parser.parse_args()
+
+    current = report(args.scale, Run(args.scale, args.repeat))
+
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(current, stream, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as stream:
+            printComparison(current, json.load(stream))
+    else:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import collections
+import gzip
+import json
+import threading
+
+from gql.transport.exceptions import TransportQueryError
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+class CassetteMiss(Exception):
+    pass
+
+
+class Cassette:
+    """ A gzip compressed file of GraphQL requests and their responses.
+
+        In record mode every request executed by a Client is appended to the
+        file with its result or errors.  In replay mode requests are answered
+        from the file without using the network.  Identical requests are
+        answered in the order they were recorded.
+
+        Page sizes (variables named *_first) are ignored when matching requests
+        because they adapt to latency, which differs between runs.  Replayed
+        pages are followed by their recorded cursors.
+    """
+    def __init__(self, path: str, mode: str):
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.stream = None
+        self.responses = collections.defaultdict(collections.deque)
+
+        if mode == RECORD:
+            self.stream = gzip.open(path, 'wt')
+        elif mode == REPLAY:
+            with gzip.open(path, 'rt') as stream:
+                for line in stream:
+                    entry = json.loads(line)
+                    self.responses[requestKey(entry['query'], entry['variables'])].append(entry)
+        else:
+            raise ValueError('Unknown cassette mode: {}'.format(mode))
+
+    def Close(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+    def Record(self, query, variable_values: dict, result: dict = None, errors: list = None):
+        """ Appends a request and its result, and the errors if it failed.
+
+            The result of a failed request is its partial data, if any.
+        """
+        entry = {
+            'query': query.text,
+            'variables': variable_values,
+            'result': result,
+            'errors': errors
+        }
+
+        with self.lock:
+            self.stream.write(json.dumps(entry, sort_keys=True) + '\n')
+
+    def Replay(self, query, variable_values: dict) -> dict:
+        """ Returns the next recorded result for a request.
+
+            Raises CassetteMiss if the request was not recorded, or has been
+            replayed as many times as it was recorded, and TransportQueryError
+            if the recorded request failed.
+        """
+        key = requestKey(query.text, variable_values)
+
+        with self.lock:
+            if not self.responses[key]:
+                raise CassetteMiss('Request was not recorded: {}'.format(key))
+
+            entry = self.responses[key].popleft()
+
+        if entry['errors']:
+            raise TransportQueryError(
+                str(entry['errors'][0]), errors=entry['errors'], data=entry['result'])
+
+        return entry['result']
+
+
+def requestKey(query: str, variable_values: dict) -> str:
+    variables = {
+        k: v for (k, v) in (variable_values or {}).items() if not k.endswith('_first')}
+
+    return query + '\n' + json.dumps(variables, sort_keys=True)
+
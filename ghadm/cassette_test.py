@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from gql.transport.exceptions import TransportQueryError
+
+from ghadm.cassette import Cassette, CassetteMiss, RECORD, REPLAY
+from ghadm.queries import Query
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'test.cassette.gz')
+        self.query = Query('query Test($after: String, $labels_first: Int!) { viewer { login } }')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_replay_in_recorded_order(self):
+        cassette = Cassette(self.path, RECORD)
+        cassette.Record(self.query, {'after': None, 'labels_first': 1}, result={'page': 1})
+        cassette.Record(self.query, {'after': None, 'labels_first': 1}, result={'page': 2})
+        cassette.Record(self.query, {'after': 'c1', 'labels_first': 1}, result={'page': 3})
+        cassette.Close()
+
+        cassette = Cassette(self.path, REPLAY)
+
+        self.assertEqual(
+            cassette.Replay(self.query, {'after': 'c1', 'labels_first': 1}), {'page': 3})
+        self.assertEqual(
+            cassette.Replay(self.query, {'after': None, 'labels_first': 1}), {'page': 1})
+        self.assertEqual(
+            cassette.Replay(self.query, {'after': None, 'labels_first': 1}), {'page': 2})
+
+    def test_replay_ignores_page_sizes(self):
+        cassette = Cassette(self.path, RECORD)
+        cassette.Record(self.query, {'after': None, 'labels_first': 25}, result={'page': 1})
+        cassette.Close()
+
+        cassette = Cassette(self.path, REPLAY)
+
+        self.assertEqual(
+            cassette.Replay(self.query, {'after': None, 'labels_first': 100}), {'page': 1})
+
+    def test_replay_miss(self):
+        cassette = Cassette(self.path, RECORD)
+        cassette.Record(self.query, {'after': None, 'labels_first': 1}, result={'page': 1})
+        cassette.Close()
+
+        cassette = Cassette(self.path, REPLAY)
+        cassette.Replay(self.query, {'after': None, 'labels_first': 1})
+
+        with self.assertRaises(CassetteMiss):
+            cassette.Replay(self.query, {'after': None, 'labels_first': 1})
+
+    def test_replay_errors(self):
+        errors = [{'type': 'NOT_FOUND', 'message': 'Could not resolve to a Repository'}]
+
+        cassette = Cassette(self.path, RECORD)
+        cassette.Record(self.query, {'after': None, 'labels_first': 1}, errors=errors)
+        cassette.Close()
+
+        cassette = Cassette(self.path, REPLAY)
+
+        with self.assertRaises(TransportQueryError) as e:
+            cassette.Replay(self.query, {'after': None, 'labels_first': 1})
+        self.assertEqual(e.exception.errors, errors)
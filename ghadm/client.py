@@ -1,7 +1,28 @@
-from gql import Client as GQLClient, gql
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from gql import Client as GQLClient
 from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import TransportQueryError, TransportServerError
 
-PAGE_SIZE = 100
+from ghadm.paging import PageSizer, NestedPageSizer, IsTransient
+from ghadm.paging import MAX_PAGE_SIZE, PAGE_RETRIES
+from ghadm.cassette import Cassette, REPLAY
+from ghadm.latency import LatencyTracker
+from ghadm.tokens import Token, TokenPool
+import ghadm.queries as queries
+
+MUTATION_BATCH_SIZE = 50
+COUNT_BATCH_SIZE = 100
+
+# Seconds allowed for a request, by operation name.
+DEFAULT_TIMEOUTS = {
+    'default': 60
+}
 
 class MissingGraphData(Exception):
     pass
@@ -72,7 +93,7 @@ class Issue:
             if n.get('labels'):
                 if n['labels']['pageInfo']['hasNextPage']:
                     errors.append('FATAL: Issue {} has more than {} labels: {}'.format(
-                        n['id'], PAGE_SIZE, n['name']))
+                        n['id'], MAX_PAGE_SIZE, n['title']))
 
                 labels = Label.DictFromNodes(n['labels']['nodes'])
 
@@ -98,7 +119,7 @@ class Repository:
         self.issues = issues
         self.errors = errors
         self.labels_by_lower_name = None
-        self.issues_by_label = {}
+        self.issue_counts = {}
 
     def __str__(self):
         print(self.name)
@@ -134,17 +155,16 @@ class Repository:
 
         return self.labels_by_lower_name
 
-    def IssuesByLabel(self, label: str) -> list[Issue]:
-        if label not in self.issues_by_label:
-            result = []
-
-            for issue in self.issues:
-                if label in self.issues[issue].labels:
-                    result.append(self.issues[issue])
-
-            self.issues_by_label[label] = result
+    def SetIssues(self, issues: dict[str, Issue], errors: list[str]):
+        """ Replaces the issues of the repository, eg. once they are fetched. """
+        self.issues = issues
+        self.errors = errors
 
-        return self.issues_by_label[label]
+    def IssueCount(self, label: str) -> int:
+        """ Returns the number of issues and pull requests with a label, as
+            fetched into issue_counts by Client.IssueCounts.
+        """
+        return self.issue_counts.get(label, 0)
 
     @classmethod
     def FromGraphQL(cls, graph: dict) -> 'Repository':
@@ -163,208 +183,708 @@ class Repository:
 
 
 class Client:
-    def __init__(self, endpoint: str, token: str):
-        self.transport = AIOHTTPTransport(
-            url=endpoint,
-            headers={
-                'Authorization': 'Bearer ' + token,
+    def __init__(
+            self,
+            endpoint: str,
+            token: str = None,
+            label_fetcher=None,
+            pool: TokenPool = None,
+            timeouts: dict = None,
+            hedge_percentile: float = None,
+            cassette: Cassette = None,
+            persisted_queries: bool = False):
+        """ Creates a client authenticated with token or with a pool of tokens.
+
+            When a pool is given each request uses the token with the largest
+            remaining rate limit budget.
+
+            Args:
+              timeouts: Seconds allowed per request, keyed by operation name,
+                with 'default' used for other operations.
+              hedge_percentile: If given, a page which has not been answered
+                within this percentile of recent latencies for its operation is
+                requested again, and the first response is used.
+              cassette: If given, every request is recorded to it or, in replay
+                mode, answered from it without using the network.
+              persisted_queries: Whether to send the sha256 hash of each query
+                instead of its text, for servers supporting automatic persisted
+                queries.  The text is only sent the first time a server sees a
+                query.
+        """
+        self.endpoint = endpoint
+        self.pool = pool or TokenPool([Token(token)])
+        self.label_fetcher = label_fetcher
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.hedge_percentile = hedge_percentile
+        self.latencies = LatencyTracker()
+        self.stats = collections.Counter()
+        self.stats_lock = threading.Lock()
+        self.cassette = cassette
+        self.persisted_queries = persisted_queries
+
+    def Summary(self) -> str:
+        """ Returns a summary of the requests made by the client. """
+        stats = self.Stats()
+        return 'Requests: {}, timeouts: {}, hedged: {} (hedge won: {})'.format(
+            stats['requests'],
+            stats['timeouts'],
+            stats['hedges'],
+            stats['hedge_wins'])
+
+    def Stats(self) -> collections.Counter:
+        """ Returns a copy of the request statistics, eg. 'requests', 'pages'
+            and the number of requests 'in_flight'.
+
+            Pages fetched by the label_fetcher are included.
+        """
+        with self.stats_lock:
+            stats = collections.Counter(self.stats)
+
+        if self.label_fetcher:
+            stats.update(self.label_fetcher.Stats())
+
+        return stats
+
+    def count(self, stat: str, n: int = 1):
+        with self.stats_lock:
+            self.stats[stat] += n
+
+    def execute(self, query, variable_values: dict = None, hedge: bool = False) -> dict:
+        """ Executes a query from ghadm.queries using a token from the pool.
+
+            Requests which are rate limited park their token until its reset
+            time and are retried with another token.  Requests which exceed the
+            timeout for their operation raise asyncio.TimeoutError.
+
+            Args:
+              hedge: Whether the request is an idempotent read which may be
+                hedged.
+        """
+        if self.cassette and self.cassette.mode == REPLAY:
+            self.count('requests')
+            return self.cassette.Replay(query, variable_values)
+
+        try:
+            result = asyncio.run(self.executeAsync(query, variable_values, hedge))
+        except TransportQueryError as e:
+            if self.cassette:
+                self.cassette.Record(query, variable_values, result=e.data, errors=e.errors)
+            raise
+
+        if self.cassette:
+            self.cassette.Record(query, variable_values, result=result)
+
+        return result
+
+    async def executeAsync(self, query, variable_values: dict, hedge: bool) -> dict:
+        operation = query.name
+        timeout = self.timeouts.get(operation, self.timeouts['default'])
+
+        delay = None
+        if hedge and self.hedge_percentile:
+            delay = self.latencies.Percentile(operation, self.hedge_percentile)
+
+        primary = asyncio.ensure_future(
+            self.attempt(query, variable_values, operation, timeout))
+        if delay is None:
+            return await primary
+
+        (done, _) = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.count('hedges')
+        secondary = asyncio.ensure_future(
+            self.attempt(query, variable_values, operation, timeout))
+
+        pending = {primary, secondary}
+        while pending:
+            (done, pending) = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is secondary:
+                        self.count('hedge_wins')
+                    return task.result()
+
+        # Both requests failed.
+        return primary.result()
+
+    async def attempt(
+            self,
+            query,
+            variable_values: dict,
+            operation: str,
+            timeout: float) -> dict:
+        """ Sends a single request, retrying with another token if rate limited. """
+        while True:
+            (token, value) = await asyncio.to_thread(self.acquire)
+            headers = {
+                'Authorization': 'Bearer ' + value,
                 'Accept': 'application/vnd.github.bane-preview+json'
-            })
-        self.client = GQLClient(
-            transport=self.transport,
-            fetch_schema_from_transport=False)
+            }
+            response = {}
+
+            self.count('requests')
+            self.count('in_flight')
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    self.send(query, variable_values, headers, response),
+                    timeout)
+            except asyncio.TimeoutError:
+                self.count('timeouts')
+                raise
+            except (TransportQueryError, TransportServerError) as e:
+                self.pool.Update(token, response.get('headers'))
+                if not isRateLimited(e, response.get('headers')):
+                    raise
+
+                self.pool.Park(
+                    token, float((response.get('headers') or {}).get('X-RateLimit-Reset', 0)))
+                continue
+            finally:
+                self.count('in_flight', -1)
+
+            self.latencies.Record(operation, time.monotonic() - start)
+            self.pool.Update(token, response.get('headers'))
+            return result
+
+    async def send(self, query, variable_values: dict, headers: dict, response: dict) -> dict:
+        """ Sends query once, storing the response headers in response. """
+        if self.persisted_queries:
+            return await self.sendPersisted(query, variable_values, headers, response)
+
+        transport = AIOHTTPTransport(url=self.endpoint, headers=headers)
+        # The request is limited by the operation's timeout in attempt.
+        client = GQLClient(
+            transport=transport,
+            fetch_schema_from_transport=False,
+            execute_timeout=None)
+
+        try:
+            async with client as session:
+                return await session.execute(
+                    query.document, variable_values=variable_values)
+        finally:
+            response['headers'] = getattr(transport, 'response_headers', None)
+
+    async def sendPersisted(
+            self,
+            query,
+            variable_values: dict,
+            headers: dict,
+            response: dict) -> dict:
+        """ Sends the hash of query, and its text only if the server asks for it. """
+        payload = {
+            'operationName': query.name,
+            'variables': variable_values or {},
+            'extensions': {
+                'persistedQuery': {
+                    'version': 1,
+                    'sha256Hash': query.hash
+                }
+            }
+        }
+
+        async with aiohttp.ClientSession(
+                headers=headers, timeout=aiohttp.ClientTimeout(total=None)) as session:
+            body = await self.post(session, payload, response)
+
+            if isPersistedQueryNotFound(body):
+                payload['query'] = query.text
+                body = await self.post(session, payload, response)
+
+        if body.get('errors'):
+            raise TransportQueryError(
+                str(body['errors'][0]), errors=body['errors'], data=body.get('data'))
+
+        return body['data']
+
+    async def post(self, session, payload: dict, response: dict) -> dict:
+        async with session.post(self.endpoint, json=payload) as r:
+            response['headers'] = r.headers
+
+            try:
+                body = await r.json(content_type=None)
+            except ValueError:
+                body = None
+
+            if not isinstance(body, dict) or ('data' not in body and 'errors' not in body):
+                raise TransportServerError('{}: {}'.format(r.status, r.reason), r.status)
+
+            return body
+
+    def acquire(self) -> tuple[Token, str]:
+        token = self.pool.Acquire()
+        try:
+            return (token, token.Value())
+        except TimeoutError:
+            # Minting an installation token timed out.
+            self.count('timeouts')
+            raise
+
+    def executePage(
+            self,
+            query,
+            variables,
+            sizers: list[PageSizer]) -> tuple[dict, float]:
+        """ Executes one page of a paginated query.
+
+            Pages which time out or fail with a gateway error are retried with
+            every sizer shrunk.
+
+            Args:
+              query: The query to execute.
+              variables: Returns the variable values for the current page sizes.
+              sizers: The PageSizers for each connection in the query.
+
+            Returns:
+              The result and the number of seconds it took.
+        """
+        for attempt in range(PAGE_RETRIES):
+            start = time.monotonic()
+            try:
+                result = self.execute(query, variable_values=variables(), hedge=True)
+                self.count('pages')
+                return (result, time.monotonic() - start)
+            except Exception as e:
+                if not IsTransient(e) or attempt == PAGE_RETRIES - 1:
+                    raise
+
+                for sizer in sizers:
+                    sizer.Failed()
 
     def User(self) -> str:
-        result = self.client.execute(gql('''
-            query { 
-              viewer {
-                login 
-              }
-            }
-        '''))
+        result = self.execute(queries.User())
 
         return result['viewer']['login']
 
-    def Repository(self, org: str, repo: str, fetch_issues: bool) -> Repository:
-        """ Queries a repository with all issues and labels.
+    def Repository(
+            self,
+            org: str,
+            repo: str,
+            fetch_issues: bool,
+            issue_filter: dict = None) -> Repository:
+        """ Queries a repository with all labels, and optionally issues.
 
-            Returns an error for each issue which has more than PAGE_SIZE labels.
+            Labels and issues are paged independently, each only until it is
+            exhausted, and issues are fetched in parallel with the labels.
+
+            If issue_filter is given only issues matching it are fetched.  It is
+            passed to the query as an IssueFilters input, eg.
+            {'states': ['OPEN'], 'since': '2024-01-01T00:00:00Z'}.
+
+            If a label_fetcher was provided labels are fetched from it instead.
+
+            Returns an error for each issue which has more than MAX_PAGE_SIZE
+            labels.
         """
-        has_next_page = True
-        issues_after = None
-        labels_after = None
-        graph = None
-
-        q_issues_after = ''
-        q_issues = ''
-        if fetch_issues:
-            q_issues_after = '$issues_after: String,'
-            q_issues = '''issues(first: $first, after: $issues_after) {
-                  nodes {
-                    id,
-                    title,
-                    labels(first: $first) {
-                      nodes {
-                        id
-                      },
-                      pageInfo {
-                        hasNextPage
-                      }
-                    }
-                  },
-                  pageInfo {
-                    hasNextPage,
-                    endCursor
-                  }
-                },
-            '''
-
-        q = gql('''
-            query Repository (
-              $owner: String!,
-              $name: String!,
-              $first: Int!,
-              ''' + q_issues_after + '''
-              $labels_after: String) { 
-              repository(owner: $owner, name: $name) {
-                id,
-                name,
-                ''' + q_issues + '''
-                labels(first: $first, after: $labels_after) {
-                  nodes {
-                    id,
-                    name,
-                    color,
-                    description
-                  },
-                  pageInfo {
-                    hasNextPage,
-                    endCursor
-                  }
-                }
-              }
-            }
-        ''')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            if fetch_issues:
+                issue_nodes = executor.submit(
+                    self.fetchIssues, org, repo, issue_filter)
+
+            if self.label_fetcher:
+                repository = self.label_fetcher.Repository(org, repo)
+            else:
+                repository = Repository.FromGraphQL(self.fetchLabels(org, repo))
+
+            if fetch_issues:
+                repository.SetIssues(*Issue.DictFromNodes(issue_nodes.result()))
+
+        return repository
+
+    def IssueCounts(
+            self,
+            org: str,
+            repo: str,
+            labels: list[Label],
+            issue_filter: dict = None) -> dict[str, int]:
+        """ Queries the number of issues and pull requests with each label,
+            without fetching them.
+
+            Counts for up to COUNT_BATCH_SIZE labels are fetched per query using
+            an aliased totalCount for each label.  Pull requests are filtered by
+            the states in issue_filter only, as they can't be filtered by since.
+
+            Returns a dict of counts keyed by label id.
+        """
+        counts = {}
+
+        for start in range(0, len(labels), COUNT_BATCH_SIZE):
+            batch = labels[start:start + COUNT_BATCH_SIZE]
 
+            q = queries.LabelIssueCounts(len(batch))
 
-        while has_next_page: 
             vv = {
                 'owner': org,
                 'name': repo,
-                'labels_after': labels_after,
-                'first': PAGE_SIZE
+                'issue_filter': issue_filter,
+                'pull_request_states': pullRequestStates(issue_filter)
             }
+            for n in range(len(batch)):
+                vv['l{}'.format(n)] = batch[n].name
 
-            if fetch_issues:
-                vv['issues_after'] = issues_after
+            result = self.execute(q, variable_values=vv)
+
+            for n in range(len(batch)):
+                label = result['repository']['l{}'.format(n)]
+                counts[batch[n].id] = (
+                    label['issues']['totalCount'] + label['pullRequests']['totalCount']
+                    if label else 0)
+
+        return counts
+
+    def Labelables(
+            self,
+            org: str,
+            repo: str,
+            label: str,
+            issue_filter: dict = None) -> list[str]:
+        """ Queries the ids of the issues and pull requests with a label.
+
+            Both are paged through the label's own connections in the same
+            queries, each only until it is exhausted.  Pull requests are
+            filtered by the states and since of issue_filter.
+
+            Returns the ids, or an empty list if the label doesn't exist.
+        """
+        sizers = {'issues': PageSizer(), 'pullRequests': PageSizer()}
+        after = {'issues': None, 'pullRequests': None}
+        pending = set(sizers)
+        since = (issue_filter or {}).get('since')
+        ids = []
+
+        q = queries.LabelLabelables()
 
-            result = self.client.execute(q, variable_values=vv)
+        def variables() -> dict:
+            return {
+                'owner': org,
+                'name': repo,
+                'label': label,
+                'include_issues': 'issues' in pending,
+                'issues_first': sizers['issues'].Size(),
+                'issues_after': after['issues'],
+                'issue_filter': issue_filter,
+                'include_pull_requests': 'pullRequests' in pending,
+                'pull_requests_first': sizers['pullRequests'].Size(),
+                'pull_requests_after': after['pullRequests'],
+                'pull_request_states': pullRequestStates(issue_filter)
+            }
 
+        while pending:
+            active = [sizers[c] for c in pending]
+            (result, seconds) = self.executePage(q, variables, active)
+
+            graph = result['repository']['label']
             if not graph:
-                graph = result
-            else:
-                labels = result['repository']['labels']['nodes']
-                graph['repository']['labels']['nodes'] += labels
+                return ids
 
-                if fetch_issues:
-                    issues = result['repository']['issues']['nodes']
-                    graph['repository']['issues']['nodes'] += issues
+            for sizer in active:
+                sizer.Observe(result['rateLimit']['cost'], seconds)
 
-            has_next_page = (result['repository']['labels']['pageInfo']['hasNextPage'] or
-                fetch_issues and result['repository']['issues']['pageInfo']['hasNextPage'])
-            label_after = result['repository']['labels']['pageInfo']['endCursor']
+            for connection in list(pending):
+                page = graph[connection]
+                nodes = page['nodes']
 
-            if fetch_issues:
-                issues_after = result['repository']['issues']['pageInfo']['endCursor']
+                if connection == 'pullRequests' and since:
+                    # Pull requests are ordered by most recently updated.
+                    nodes = [n for n in nodes if n['updatedAt'] >= since]
+                    if len(nodes) < len(page['nodes']):
+                        page['pageInfo']['hasNextPage'] = False
 
-        return Repository.FromGraphQL(graph)
+                ids += [n['id'] for n in nodes]
 
-    def CreateLabel(self, repo: Repository, label: Label):
-        m = gql('''
-            mutation CreateLabel($l: CreateLabelInput!) { 
-              createLabel(input: $l) {
-                label {
-                  name
-                }
-              }
+                if page['pageInfo']['hasNextPage']:
+                    after[connection] = page['pageInfo']['endCursor']
+                else:
+                    pending.remove(connection)
+
+        return ids
+
+    def fetchLabels(self, org: str, repo: str) -> dict:
+        """ Returns a repository graph containing every label. """
+        label_sizer = PageSizer()
+
+        q = queries.RepositoryLabels()
+
+        def variables(after: str) -> dict:
+            return {
+                'owner': org,
+                'name': repo,
+                'labels_after': after,
+                'labels_first': label_sizer.Size()
+            }
+
+        (graph, nodes) = self.paginate(q, variables, 'labels', [label_sizer])
+        graph['repository']['labels']['nodes'] = nodes
+
+        return graph
+
+    def fetchIssues(self, org: str, repo: str, issue_filter: dict = None) -> list[dict]:
+        """ Returns the nodes of every issue matching issue_filter, with the ids
+            of their labels.
+
+            Page sizes are chosen from the cost and latency of earlier pages,
+            and from the number of labels seen per issue.
+        """
+        issue_sizer = PageSizer()
+        issue_label_sizer = NestedPageSizer()
+
+        q = queries.RepositoryIssues()
+
+        def variables(after: str) -> dict:
+            return {
+                'owner': org,
+                'name': repo,
+                'issues_after': after,
+                'issues_first': issue_sizer.Size(),
+                'issue_labels_first': issue_label_sizer.Size(),
+                'issue_filter': issue_filter
             }
-        ''')
 
-        vv = {
-            'l': {
+        (_, nodes) = self.paginate(
+            q, variables, 'issues', [issue_sizer, issue_label_sizer])
+
+        return nodes
+
+    def paginate(
+            self,
+            query,
+            variables,
+            connection: str,
+            sizers: list[PageSizer]) -> tuple[dict, list[dict]]:
+        """ Pages through one connection of a repository until it is exhausted.
+
+            If any sizer is a NestedPageSizer, it sizes the labels connection of
+            each node and pages whose nodes overflow it are fetched again.
+
+            Args:
+              query: The query to execute.
+              variables: Returns the variable values for a cursor.
+              connection: The name of the connection in the repository.
+              sizers: The PageSizers for the connection and nested connections.
+
+            Returns:
+              The result of the first page and the nodes from every page.
+        """
+        nested = [s for s in sizers if isinstance(s, NestedPageSizer)]
+        after = None
+        first = None
+        nodes = []
+
+        while True:
+            (result, seconds) = self.executePage(
+                query, lambda: variables(after), sizers)
+            page = result['repository'][connection]
+
+            if nested:
+                overflowed = any(
+                    n['labels']['pageInfo']['hasNextPage'] for n in page['nodes'])
+                if overflowed and nested[0].Overflowed():
+                    # Fetch the same page again with room for every label.
+                    continue
+
+                nested[0].ObserveDensity(
+                    [len(n['labels']['nodes']) for n in page['nodes']])
+
+            for sizer in sizers:
+                sizer.Observe(result['rateLimit']['cost'], seconds)
+
+            first = first or result
+            nodes += page['nodes']
+
+            if not page['pageInfo']['hasNextPage']:
+                return (first, nodes)
+
+            after = page['pageInfo']['endCursor']
+
+    def AddLabels(self, labelables: dict[str, list[str]]) -> list[Exception]:
+        """ Adds label ids to issues or pull requests, keyed by their ids.
+
+            Each issue or pull request is updated by a single mutation, batched
+            into requests of up to MUTATION_BATCH_SIZE.
+
+            Returns:
+              The error for each issue or pull request, in order, or None if it
+              was updated.
+        """
+        inputs = [
+            {'labelableId': id, 'labelIds': label_ids}
+            for (id, label_ids) in labelables.items()]
+
+        return self.executeBatch(
+            'AddLabels',
+            'addLabelsToLabelable',
+            'AddLabelsToLabelableInput',
+            'clientMutationId',
+            inputs)
+
+    def RemoveLabels(self, labelables: dict[str, list[str]]) -> list[Exception]:
+        """ Removes label ids from issues or pull requests, keyed by their ids.
+
+            Each issue or pull request is updated by a single mutation, batched
+            into requests of up to MUTATION_BATCH_SIZE.
+
+            Returns:
+              The error for each issue or pull request, in order, or None if it
+              was updated.
+        """
+        inputs = [
+            {'labelableId': id, 'labelIds': label_ids}
+            for (id, label_ids) in labelables.items()]
+
+        return self.executeBatch(
+            'RemoveLabels',
+            'removeLabelsFromLabelable',
+            'RemoveLabelsFromLabelableInput',
+            'clientMutationId',
+            inputs)
+
+    def CreateLabels(self, labels: list[tuple[Repository, Label]]) -> list[Exception]:
+        """ Creates labels, given as (repo, label) pairs, batched into requests
+            of up to MUTATION_BATCH_SIZE.
+
+            Returns:
+              The error for each label, in order, or None if it was created.
+        """
+        inputs = [
+            {
                 'name': label.name,
                 'color': label.color,
                 'description': label.description,
                 'repositoryId': repo.id
             }
-        }
+            for (repo, label) in labels]
 
-        self.client.execute(m, variable_values=vv)
-        
-    def EditLabel(self, extant: Label, update: Label):
-        m = gql('''
-            mutation UpdateLabel($l: UpdateLabelInput!) { 
-              updateLabel(input: $l) {
-                label {
-                  name
-                }
-              }
-            }
-        ''')
+        return self.executeBatch(
+            'CreateLabels', 'createLabel', 'CreateLabelInput', 'label { name }', inputs)
 
-        vv = {
-            'l': {
+    def EditLabels(self, edits: list[tuple[Label, Label]]) -> list[Exception]:
+        """ Updates each extant label to its update, given as (extant, update)
+            pairs, batched into requests of up to MUTATION_BATCH_SIZE.
+
+            Returns:
+              The error for each edit, in order, or None if it was applied.
+        """
+        inputs = [
+            {
                 'name': update.name,
                 'color': update.color,
                 'description': update.description,
                 'id': extant.id
             }
-        }
+            for (extant, update) in edits]
 
-        self.client.execute(m, variable_values=vv)
-
-    def Relabel(self, issues: list[Issue], extant: Label, update: Label):
-        for issue in issues:
-            issue.labels.pop(extant.id, None)
-            
-            if not issue.labels.get(update.id):
-                issue.labels[update.id] = update
-
-            m = gql('''
-                mutation UpdateIssue($i: UpdateIssueInput!) { 
-                  updateIssue(input: $i) {
-                    issue {
-                      id
-                    }
-                  }
-                }
-            ''')
+        return self.executeBatch(
+            'UpdateLabels', 'updateLabel', 'UpdateLabelInput', 'label { name }', inputs)
 
-            vv = {
-                'i': {
-                    'labelIds': list(issue.labels.keys()),
-                    'id': issue.id
-                }
-            }
+    def DeleteLabels(self, labels: list[Label]) -> list[Exception]:
+        """ Deletes labels, batched into requests of up to MUTATION_BATCH_SIZE.
 
-            self.client.execute(m, variable_values=vv)
+            Returns:
+              The error for each label, in order, or None if it was deleted.
+        """
+        inputs = [{'id': label.id} for label in labels]
 
-        self.DeleteLabel(extant)
+        return self.executeBatch(
+            'DeleteLabels', 'deleteLabel', 'DeleteLabelInput', 'clientMutationId', inputs)
 
-        
-    def DeleteLabel(self, extant: Label):
-        d = gql('''
-            mutation DeleteLabel($l: DeleteLabelInput!) { 
-              deleteLabel(input: $l) {
-                clientMutationId
-              }
-            }
-        ''')
+    def executeBatch(
+            self,
+            name: str,
+            field: str,
+            input_type: str,
+            selection: str,
+            inputs: list[dict]) -> list[Exception]:
+        """ Executes one aliased mutation field per input.
+
+            Inputs are sent in requests of up to MUTATION_BATCH_SIZE mutations.
+            A failed request does not stop the requests for later inputs.
+
+            Returns:
+              The error for each input, in order, or None if its mutation
+              succeeded.
+        """
+        errors = []
 
-        vv = {
-            'l': {
-                'id': extant.id
-            }
-        }
+        for start in range(0, len(inputs), MUTATION_BATCH_SIZE):
+            batch = inputs[start:start + MUTATION_BATCH_SIZE]
+
+            m = queries.Batch(name, field, input_type, selection, len(batch))
+
+            vv = {'i{}'.format(n): batch[n] for n in range(len(batch))}
+
+            try:
+                self.execute(m, variable_values=vv)
+                errors += [None] * len(batch)
+            except TransportQueryError as e:
+                errors += batchErrors(e, len(batch))
+            except Exception as e:
+                errors += [e] * len(batch)
+
+        return errors
+
+
+def isRateLimited(e: Exception, headers) -> bool:
+    """ Returns whether e was caused by the token's budget being exhausted. """
+    if isinstance(e, TransportQueryError):
+        for error in e.errors or []:
+            if error.get('type') == 'RATE_LIMITED':
+                return True
+
+    return bool(headers) and headers.get('X-RateLimit-Remaining') == '0'
+
+
+def batchErrors(e: TransportQueryError, size: int) -> list[Exception]:
+    """ Returns the error for each aliased field, m0, m1..., of a batched
+        mutation which failed with e, or None for those which succeeded.
+
+        Errors are attributed to a field by the alias at the start of their
+        path.  Fields without data which have no error of their own failed with
+        e.
+    """
+    if e.data is None:
+        return [e] * size
+
+    errors = [None] * size
+    for error in e.errors or []:
+        path = error.get('path') or []
+        if path and isinstance(path[0], str) and path[0][1:].isdigit():
+            n = int(path[0][1:])
+            if n < size and errors[n] is None:
+                errors[n] = TransportQueryError(
+                    error.get('message', str(error)), errors=[error])
+
+    for n in range(size):
+        if errors[n] is None and e.data.get('m{}'.format(n)) is None:
+            errors[n] = e
+
+    return errors
+
+
+def pullRequestStates(issue_filter: dict) -> list[str]:
+    """ Returns the PullRequestStates matching the states of issue_filter. """
+    states = (issue_filter or {}).get('states')
+    if not states:
+        return None
+
+    result = []
+    for state in states:
+        result += ['CLOSED', 'MERGED'] if state == 'CLOSED' else [state]
+
+    return result
+
+
+def isPersistedQueryNotFound(body: dict) -> bool:
+    """ Returns whether a server needs the text of a persisted query. """
+    for error in body.get('errors') or []:
+        if (error.get('message') == 'PersistedQueryNotFound' or
+                (error.get('extensions') or {}).get('code') == 'PERSISTED_QUERY_NOT_FOUND'):
+            return True
 
-        self.client.execute(d, variable_values=vv)
+    return False
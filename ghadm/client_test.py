@@ -0,0 +1,533 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from aiohttp import web
+
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+
+from ghadm import queries
+from ghadm.client import Client, Label, COUNT_BATCH_SIZE
+from ghadm.latency import MIN_SAMPLES
+from ghadm.tokens import Token, TokenPool
+
+class FakeClient(Client):
+    """ A Client which answers queries from canned pages keyed by cursor. """
+    def __init__(self, label_pages: dict, issue_pages: dict):
+        super().__init__('https://x/graphql', token='test_token')
+        self.label_pages = label_pages
+        self.issue_pages = issue_pages
+        self.requests = []
+
+    def execute(self, document, variable_values: dict = None, hedge: bool = False) -> dict:
+        self.requests.append(variable_values)
+
+        if 'labels_after' in variable_values:
+            connection = 'labels'
+            page = self.label_pages[variable_values['labels_after']]
+        else:
+            connection = 'issues'
+            page = self.issue_pages[variable_values['issues_after']]
+
+        return {
+            'rateLimit': {'cost': 1},
+            'repository': {
+                'id': 'test_repo_id',
+                'name': 'test_repo_name',
+                connection: page
+            }
+        }
+
+
+class FakeLabelableClient(Client):
+    """ A Client which answers label connections from canned pages keyed by
+        cursor.
+    """
+    def __init__(self, issue_pages: dict, pull_request_pages: dict):
+        super().__init__('https://x/graphql', token='test_token')
+        self.issue_pages = issue_pages
+        self.pull_request_pages = pull_request_pages
+        self.requests = []
+
+    def execute(self, document, variable_values: dict = None, hedge: bool = False) -> dict:
+        self.requests.append(variable_values)
+
+        label = {}
+        if variable_values['include_issues']:
+            label['issues'] = self.issue_pages[variable_values['issues_after']]
+        if variable_values['include_pull_requests']:
+            label['pullRequests'] = self.pull_request_pages[
+                variable_values['pull_requests_after']]
+
+        return {'rateLimit': {'cost': 1}, 'repository': {'label': label}}
+
+
+class FakeCountClient(Client):
+    """ A Client which answers label counts from fixed counts keyed by label
+        name, with None for missing labels.
+    """
+    def __init__(self, counts: dict[str, tuple[int, int]]):
+        super().__init__('https://x/graphql', token='test_token')
+        self.counts = counts
+        self.requests = []
+
+    def execute(self, query, variable_values: dict = None, hedge: bool = False) -> dict:
+        self.requests.append((query, variable_values))
+
+        repository = {}
+        for (name, value) in variable_values.items():
+            if name.startswith('l') and name[1:].isdigit():
+                count = self.counts.get(value)
+                repository[name] = {
+                    'issues': {'totalCount': count[0]},
+                    'pullRequests': {'totalCount': count[1]}
+                } if count else None
+
+        return {'repository': repository}
+
+
+class LocalServer:
+    """ A GraphQL endpoint on localhost, answering each request with the
+        result of handler(body).
+
+        Args:
+          handler: An async function returning the JSON response for a request
+            body.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.bodies = []
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self) -> 'LocalServer':
+        self.thread.start()
+        self.started.wait()
+        return self
+
+    def __exit__(self, *args):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.start())
+        self.started.set()
+        self.loop.run_forever()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/graphql', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = 'http://127.0.0.1:{}/graphql'.format(port)
+
+    async def handle(self, request):
+        body = await request.json()
+        self.bodies.append(body)
+        return await self.handler(body)
+
+
+class FakeSendClient(Client):
+    """ A Client whose requests are answered by a function of the request's
+        Authorization header.
+    """
+    def __init__(self, respond, **kwargs):
+        super().__init__('https://x/graphql', **kwargs)
+        self.respond = respond
+        self.authorizations = []
+
+    async def send(self, query, variable_values: dict, headers: dict, response: dict) -> dict:
+        self.authorizations.append(headers['Authorization'])
+        return await self.respond(headers['Authorization'], response)
+
+
+class TestClient(unittest.TestCase):
+
+    def test_repository_labels_paged_until_exhausted(self):
+        client = FakeClient(
+            {
+                None: self.create_test_page([self.create_test_label_node('1')], 'l1'),
+                'l1': self.create_test_page([self.create_test_label_node('2')])
+            },
+            {})
+
+        repository = client.Repository('test_org', 'test_repo_name', fetch_issues=False)
+
+        self.assertEqual(
+            [r['labels_after'] for r in client.requests], [None, 'l1'])
+        self.assertEqual(repository.labels, {
+            'test_label_id_1': self.create_test_label('1'),
+            'test_label_id_2': self.create_test_label('2')})
+
+    def test_repository_issues_paged_independently(self):
+        client = FakeClient(
+            {
+                None: self.create_test_page([self.create_test_label_node('1')])
+            },
+            {
+                None: self.create_test_page([self.create_test_issue_node('1')], 'i1'),
+                'i1': self.create_test_page([self.create_test_issue_node('2')], 'i2'),
+                'i2': self.create_test_page([self.create_test_issue_node('3')])
+            })
+
+        repository = client.Repository('test_org', 'test_repo_name', fetch_issues=True)
+
+        label_requests = [r for r in client.requests if 'labels_after' in r]
+        issue_requests = [r for r in client.requests if 'issues_after' in r]
+
+        self.assertEqual(len(label_requests), 1)
+        self.assertEqual(
+            [r['issues_after'] for r in issue_requests], [None, 'i1', 'i2'])
+        self.assertEqual(
+            sorted(repository.issues), ['test_issue_id_1', 'test_issue_id_2', 'test_issue_id_3'])
+        self.assertEqual(repository.errors, [])
+
+    def test_repository_issue_label_overflow_refetched(self):
+        overflowing = self.create_test_issue_node('1')
+        overflowing['labels']['pageInfo']['hasNextPage'] = True
+
+        client = FakeClient(
+            {None: self.create_test_page([])},
+            {None: self.create_test_page([overflowing])})
+
+        repository = client.Repository('test_org', 'test_repo_name', fetch_issues=True)
+
+        issue_requests = [r for r in client.requests if 'issues_after' in r]
+
+        self.assertEqual(
+            [r['issue_labels_first'] for r in issue_requests], [20, 100])
+        self.assertEqual(len(repository.errors), 1)
+
+    def test_labelables_paged_together(self):
+        client = FakeLabelableClient(
+            {
+                None: self.create_test_page([{'id': 'test_issue_id_1'}], 'i1'),
+                'i1': self.create_test_page([{'id': 'test_issue_id_2'}], 'i2'),
+                'i2': self.create_test_page([{'id': 'test_issue_id_3'}])
+            },
+            {
+                None: self.create_test_page([
+                    {'id': 'test_pr_id_1', 'updatedAt': '2024-03-01T00:00:00Z'}])
+            })
+
+        ids = client.Labelables('test_org', 'test_repo_name', 'test_label_1')
+
+        self.assertEqual(
+            [(r['include_issues'], r['include_pull_requests']) for r in client.requests],
+            [(True, True), (True, False), (True, False)])
+        self.assertEqual(
+            sorted(ids),
+            ['test_issue_id_1', 'test_issue_id_2', 'test_issue_id_3', 'test_pr_id_1'])
+
+    def test_labelables_pull_requests_since(self):
+        client = FakeLabelableClient(
+            {None: self.create_test_page([])},
+            {
+                None: self.create_test_page([
+                    {'id': 'test_pr_id_1', 'updatedAt': '2024-03-01T00:00:00Z'},
+                    {'id': 'test_pr_id_2', 'updatedAt': '2023-12-01T00:00:00Z'}], 'p1')
+            })
+
+        ids = client.Labelables(
+            'test_org', 'test_repo_name', 'test_label_1',
+            {'states': ['CLOSED'], 'since': '2024-01-01T00:00:00Z'})
+
+        self.assertEqual(ids, ['test_pr_id_1'])
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(client.requests[0]['pull_request_states'], ['CLOSED', 'MERGED'])
+
+    def test_rate_limited_request_retried_with_another_token(self):
+        limited = Token('test_token_1')
+        available = Token('test_token_2')
+
+        async def respond(authorization: str, response: dict) -> dict:
+            if authorization == 'Bearer test_token_1':
+                response['headers'] = {
+                    'X-RateLimit-Remaining': '0',
+                    'X-RateLimit-Reset': '4102444800'
+                }
+                raise TransportQueryError(
+                    'rate limited', errors=[{'type': 'RATE_LIMITED'}])
+
+            response['headers'] = {'X-RateLimit-Remaining': '4000'}
+            return {'viewer': {'login': 'test_login'}}
+
+        client = FakeSendClient(respond, pool=TokenPool([limited, available]))
+        result = client.execute(queries.User())
+
+        self.assertEqual(result, {'viewer': {'login': 'test_login'}})
+        self.assertEqual(
+            client.authorizations, ['Bearer test_token_1', 'Bearer test_token_2'])
+        self.assertEqual(limited.reset_at, 4102444800.0)
+        self.assertEqual(available.remaining, 4000)
+
+    def test_hedge_sent_after_percentile_delay(self):
+        started = []
+
+        async def respond(authorization: str, response: dict) -> dict:
+            started.append(time.monotonic())
+            if len(started) == 1:
+                await asyncio.sleep(1)
+                return {'viewer': {'login': 'test_primary'}}
+            return {'viewer': {'login': 'test_hedge'}}
+
+        client = self.create_test_hedging_client(respond)
+        start = time.monotonic()
+        result = client.execute(queries.User(), hedge=True)
+
+        self.assertEqual(result, {'viewer': {'login': 'test_hedge'}})
+        self.assertGreaterEqual(started[1] - start, 0.05)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(client.Stats()['hedges'], 1)
+        self.assertEqual(client.Stats()['hedge_wins'], 1)
+
+    def test_hedge_not_sent_before_percentile_delay(self):
+        async def respond(authorization: str, response: dict) -> dict:
+            return {'viewer': {'login': 'test_primary'}}
+
+        client = self.create_test_hedging_client(respond)
+        result = client.execute(queries.User(), hedge=True)
+
+        self.assertEqual(result, {'viewer': {'login': 'test_primary'}})
+        self.assertEqual(len(client.authorizations), 1)
+        self.assertEqual(client.Stats()['hedges'], 0)
+
+    def test_hedge_primary_wins(self):
+        started = []
+
+        async def respond(authorization: str, response: dict) -> dict:
+            started.append(time.monotonic())
+            if len(started) == 1:
+                await asyncio.sleep(0.1)
+                return {'viewer': {'login': 'test_primary'}}
+            await asyncio.sleep(1)
+            return {'viewer': {'login': 'test_hedge'}}
+
+        client = self.create_test_hedging_client(respond)
+        result = client.execute(queries.User(), hedge=True)
+
+        self.assertEqual(result, {'viewer': {'login': 'test_primary'}})
+        self.assertEqual(client.Stats()['hedges'], 1)
+        self.assertEqual(client.Stats()['hedge_wins'], 0)
+
+    def test_hedge_both_failed_raises(self):
+        started = []
+
+        async def respond(authorization: str, response: dict) -> dict:
+            started.append(time.monotonic())
+            if len(started) == 1:
+                await asyncio.sleep(0.1)
+            raise TransportQueryError(
+                'failed {}'.format(len(started)), errors=[{'type': 'NOT_FOUND'}])
+
+        client = self.create_test_hedging_client(respond)
+
+        with self.assertRaises(TransportQueryError):
+            client.execute(queries.User(), hedge=True)
+        self.assertEqual(len(started), 2)
+        self.assertEqual(client.Stats()['hedge_wins'], 0)
+
+    def test_timeout_raises_and_counted(self):
+        async def respond(authorization: str, response: dict) -> dict:
+            await asyncio.sleep(1)
+            return {'viewer': {'login': 'test_login'}}
+
+        client = FakeSendClient(respond, token='test_token', timeouts={'default': 0.05})
+
+        with self.assertRaises(asyncio.TimeoutError):
+            client.execute(queries.User())
+        self.assertEqual(client.Stats()['timeouts'], 1)
+        self.assertEqual(client.Stats()['in_flight'], 0)
+
+    def test_batch_errors_reported_per_mutation(self):
+        async def respond(authorization: str, response: dict) -> dict:
+            raise TransportQueryError(
+                'not found',
+                errors=[{'message': 'not found', 'path': ['m1']}],
+                data={
+                    'm0': {'clientMutationId': None},
+                    'm1': None,
+                    'm2': {'clientMutationId': None}
+                })
+
+        client = FakeSendClient(respond, token='test_token')
+        errors = client.DeleteLabels(
+            [self.create_test_label(ordinal) for ordinal in ['1', '2', '3']])
+
+        self.assertEqual([e is None for e in errors], [True, False, True])
+        self.assertEqual(str(errors[1]), 'not found')
+
+    def test_batch_errors_without_data_fail_every_mutation(self):
+        async def respond(authorization: str, response: dict) -> dict:
+            raise TransportQueryError('invalid', errors=[{'message': 'invalid'}])
+
+        client = FakeSendClient(respond, token='test_token')
+        errors = client.DeleteLabels(
+            [self.create_test_label(ordinal) for ordinal in ['1', '2']])
+
+        self.assertEqual([str(e) for e in errors], ['invalid', 'invalid'])
+
+    def test_timeout_above_gql_default(self):
+        async def handler(body: dict):
+            await asyncio.sleep(10.5)
+            return web.json_response({'data': {'viewer': {'login': 'test_login'}}})
+
+        with LocalServer(handler) as server:
+            client = Client(server.url, token='test_token', timeouts={'default': 30})
+            result = client.execute(queries.User())
+
+        self.assertEqual(result, {'viewer': {'login': 'test_login'}})
+        self.assertEqual(client.Stats()['timeouts'], 0)
+
+    def test_mint_timeout_counted(self):
+        class TimingOutToken(Token):
+            def Value(self) -> str:
+                raise TimeoutError('timed out')
+
+        async def respond(authorization: str, response: dict) -> dict:
+            return {}
+
+        client = FakeSendClient(respond, pool=TokenPool([TimingOutToken(None)]))
+
+        with self.assertRaises(TimeoutError):
+            client.execute(queries.User())
+        self.assertEqual(client.Stats()['timeouts'], 1)
+
+    def test_persisted_query_text_sent_once(self):
+        known = set()
+
+        async def handler(body: dict):
+            sha256 = body['extensions']['persistedQuery']['sha256Hash']
+            if 'query' in body:
+                known.add(sha256)
+            elif sha256 not in known:
+                return web.json_response(
+                    {'errors': [{'message': 'PersistedQueryNotFound'}]})
+
+            return web.json_response({'data': {'viewer': {'login': 'test_login'}}})
+
+        with LocalServer(handler) as server:
+            client = Client(server.url, token='test_token', persisted_queries=True)
+            first = client.execute(queries.User())
+            second = client.execute(queries.User())
+
+        self.assertEqual(first, {'viewer': {'login': 'test_login'}})
+        self.assertEqual(second, first)
+        self.assertEqual(
+            [('query' in body, body['operationName']) for body in server.bodies],
+            [(False, 'User'), (True, 'User'), (False, 'User')])
+        self.assertEqual(
+            set(b['extensions']['persistedQuery']['sha256Hash'] for b in server.bodies),
+            {queries.User().hash})
+        self.assertEqual(server.bodies[1]['query'], queries.User().text)
+
+    def test_persisted_query_errors(self):
+        async def handler(body: dict):
+            return web.json_response({
+                'data': {'m0': None},
+                'errors': [{'message': 'not found', 'path': ['m0']}]
+            })
+
+        with LocalServer(handler) as server:
+            client = Client(server.url, token='test_token', persisted_queries=True)
+            with self.assertRaises(TransportQueryError) as raised:
+                client.execute(queries.User())
+
+        self.assertEqual(raised.exception.errors, [{'message': 'not found', 'path': ['m0']}])
+        self.assertEqual(raised.exception.data, {'m0': None})
+
+    def test_persisted_query_server_error(self):
+        async def handler(body: dict):
+            return web.Response(status=502, text='Bad Gateway')
+
+        with LocalServer(handler) as server:
+            client = Client(server.url, token='test_token', persisted_queries=True)
+            with self.assertRaises(TransportServerError) as raised:
+                client.execute(queries.User())
+
+        self.assertEqual(raised.exception.code, 502)
+
+    def create_test_hedging_client(self, respond) -> 'FakeSendClient':
+        """ Returns a client which hedges User requests after 0.05 seconds. """
+        client = FakeSendClient(
+            respond, token='test_token', timeouts={'default': 2}, hedge_percentile=95)
+        for _ in range(MIN_SAMPLES):
+            client.latencies.Record('User', 0.05)
+
+        return client
+
+    def test_issue_counts(self):
+        client = FakeCountClient({'test_label_1': (3, 2), 'test_label_2': (0, 1)})
+
+        counts = client.IssueCounts(
+            'test_org',
+            'test_repo_name',
+            [self.create_test_label(ordinal) for ordinal in ['1', '2', '3']],
+            {'states': ['CLOSED']})
+
+        self.assertEqual(
+            counts, {'test_label_id_1': 5, 'test_label_id_2': 1, 'test_label_id_3': 0})
+        self.assertEqual(len(client.requests), 1)
+
+        (query, variables) = client.requests[0]
+        self.assertEqual(query.name, 'LabelIssueCounts')
+        self.assertEqual(
+            [variables['l{}'.format(n)] for n in range(3)],
+            ['test_label_1', 'test_label_2', 'test_label_3'])
+        self.assertEqual(variables['issue_filter'], {'states': ['CLOSED']})
+        self.assertEqual(variables['pull_request_states'], ['CLOSED', 'MERGED'])
+
+    def test_issue_counts_batched(self):
+        labels = [self.create_test_label(str(n)) for n in range(COUNT_BATCH_SIZE + 1)]
+        client = FakeCountClient({label.name: (1, 0) for label in labels})
+
+        counts = client.IssueCounts('test_org', 'test_repo_name', labels)
+
+        self.assertEqual(counts, {label.id: 1 for label in labels})
+        self.assertEqual(
+            [len(variables) - 4 for (_, variables) in client.requests],
+            [COUNT_BATCH_SIZE, 1])
+        self.assertEqual(
+            client.requests[1][1]['l0'], 'test_label_{}'.format(COUNT_BATCH_SIZE))
+
+    def create_test_page(self, nodes: list[dict], end_cursor: str = None):
+        return {
+            'nodes': nodes,
+            'pageInfo': {
+                'hasNextPage': end_cursor is not None,
+                'endCursor': end_cursor
+            }
+        }
+
+    def create_test_label_node(self, ordinal: str):
+        return {
+            'id': 'test_label_id_{}'.format(ordinal),
+            'name': 'test_label_{}'.format(ordinal),
+            'color': 'test_color_{}'.format(ordinal),
+            'description': 'test_description_{}'.format(ordinal)
+        }
+
+    def create_test_issue_node(self, ordinal: str):
+        return {
+            'id': 'test_issue_id_{}'.format(ordinal),
+            'title': 'test_issue_title_{}'.format(ordinal),
+            'labels': {
+                'nodes': [{'id': 'test_label_id_1'}],
+                'pageInfo': {'hasNextPage': False}
+            }
+        }
+
+    def create_test_label(self, ordinal: str):
+        return Label(
+            'test_label_id_{}'.format(ordinal),
+            'test_label_{}'.format(ordinal),
+            'test_description_{}'.format(ordinal),
+            'test_color_{}'.format(ordinal))
@@ -1,21 +1,59 @@
 import sys
 import traceback
 import argparse
+import datetime
+import re
 
-from ghadm.client import Client
+from ghadm.cassette import Cassette, RECORD, REPLAY
+from ghadm.client import Client, DEFAULT_TIMEOUTS
+import ghadm.mirror as mirror
+import ghadm.output as output
+from ghadm.progress import Progress
+from ghadm.rest import RestLabelFetcher
+from ghadm.tokens import PoolFromConfig
 import ghadm.labels as labels
 import ghadm.config as cfg
 
 LABEL_DESC = 'manage labels for a GitHub organization'
 LABEL_SYNC_HELP = 'sync labels for a GitHub organization'
-LABEL_SYNC_RELABEL_HELP = 'relabel issues when a synonym is merged as part of a sync (slow)'
+LABEL_SYNC_RELABEL_HELP = ('relabel issues and pull requests when a synonym is merged '
+                           'as part of a sync (slow)')
+LABEL_SYNC_STATE_HELP = ('only relabel issues and pull requests in this state, overrides '
+                         'relabel.state (merged synonyms are removed from the relabelled '
+                         'issues and pull requests rather than deleted)')
+LABEL_SYNC_SINCE_HELP = ('only relabel issues and pull requests updated on or after this '
+                         'ISO 8601 date, overrides relabel.since (merged synonyms are '
+                         'removed from the relabelled issues and pull requests rather '
+                         'than deleted)')
+LABEL_SYNC_FROM_REPO_HELP = ('sync labels to match a template repository, '
+                             'instead of the configured labels')
 LABEL_SEARCH_HELP = 'search for labels in a GitHub organization'
 LABEL_SEARCH_PATTERN_HELP = 'pattern to search for'
-LABEL_DELETE_HELP = 'delete a label from a GitHub organization'
-LABEL_DELETE_LABEL_HELP = 'label to delete'
+LABEL_SEARCH_LOCAL_HELP = 'search the local mirror instead of fetching every repository'
+LABEL_REFRESH_HELP = 'update the local mirror first'
+LABEL_QUERY_HELP = 'query label usage from the local mirror'
+LABEL_QUERY_LABEL_HELP = 'label to report usage of'
+LABEL_QUERY_PATTERN_HELP = 'pattern matching the labels to report usage of'
+LABEL_DELETE_HELP = 'delete labels from a GitHub organization'
+LABEL_DELETE_LABEL_HELP = 'labels to delete'
+LABEL_DELETE_PATTERN_HELP = 'delete labels matching this pattern, may be repeated'
+LABEL_RENAME_HELP = 'rename labels in a GitHub organization'
+LABEL_RENAME_LABEL_HELP = 'rename the label OLD to NEW, may be repeated'
+LABEL_RENAME_PATTERN_HELP = ('rename labels matching PATTERN by substituting '
+                             'REPLACEMENT for the match, may be repeated')
+LABEL_YES_HELP = 'execute without prompting for confirmation'
+LABEL_NO_PROGRESS_HELP = ('do not report progress on stderr, which is redrawn in place '
+                          'on a terminal and otherwise logged every 30 seconds')
+LABEL_OUTPUT_HELP = ('output format, ndjson streams one JSON record per repository, '
+                     'planned action and result (default: text)')
+
+MIRROR_DESC = 'update the local mirror of labels and label usage'
+MIRROR_FULL_HELP = 'refetch every issue rather than those updated since the last update'
 
 CMD_DESC = 'manage GitHub objects for an organization'
 CMD_EPILOG = 'Reads configuration from ~/.ghadm.yaml'
+CMD_RECORD_HELP = 'record every GitHub request and response to a compressed cassette file'
+CMD_REPLAY_HELP = 'answer GitHub requests from a cassette file without using the network'
 
 class CommandUnimplemented(Exception):
     pass
@@ -25,11 +63,61 @@ def main():
     if not config:
         sys.exit()
 
-    client = Client(endpoint=config['endpoint'], token=config['access_token'])
-
     parser = commandParser()
     args = parser.parse_args()
 
+    pool = PoolFromConfig(config)
+
+    cassette = None
+    if args.record:
+        cassette = Cassette(args.record, RECORD)
+    elif args.replay:
+        cassette = Cassette(args.replay, REPLAY)
+
+    timeouts = dict(DEFAULT_TIMEOUTS, **(config.get('timeouts') or {}))
+
+    label_fetcher = None
+    # Label fetches over REST bypass the cassette, so use GraphQL for them.
+    if config.get('label_cache') and not cassette:
+        label_fetcher = RestLabelFetcher(
+            endpoint=config.get('rest_endpoint', 'https://api.github.com'),
+            pool=pool.Derive(),
+            cache_path=config['label_cache'],
+            timeout=timeouts.get('RestLabels', timeouts['default']))
+
+    client = Client(
+        endpoint=config['endpoint'],
+        label_fetcher=label_fetcher,
+        pool=pool,
+        timeouts=timeouts,
+        hedge_percentile=config.get('hedge_percentile'),
+        cassette=cassette,
+        persisted_queries=config.get('persisted_queries', False))
+
+    progress = None
+    if not getattr(args, 'no_progress', True):
+        progress = Progress(client)
+        progress.Start()
+
+    try:
+        runCommand(client, config, parser, args, progress)
+    finally:
+        if progress:
+            progress.Stop()
+        if label_fetcher:
+            label_fetcher.Close()
+        if cassette:
+            cassette.Close()
+
+    print(client.Summary(), file=sys.stderr)
+
+
+def runCommand(
+        client: Client,
+        config: dict,
+        parser: argparse.ArgumentParser,
+        args: argparse.Namespace,
+        progress: Progress = None):
     if not hasattr(args, 'command'):
         print('Error: No command specified')
         parser.print_help()
@@ -42,15 +130,62 @@ def main():
             sys.exit(1)
 
         if args.subcommand and args.subcommand == 'sync':
-            labels.Sync(client, config, relabel=args.relabel)
+            try:
+                issue_filter = labels.IssueFilter(config, args.state, args.since)
+            except (TypeError, ValueError) as e:
+                print('Error: Invalid relabel.since: {}'.format(e))
+                sys.exit(1)
+
+            if args.from_repo:
+                if '/' not in args.from_repo:
+                    print('Error: --from-repo must be ORG/REPO')
+                    sys.exit(1)
+
+                config = labels.TemplateConfig(client, config, args.from_repo)
+
+            labels.Sync(
+                client, config, relabel=args.relabel, issue_filter=issue_filter,
+                output=args.output, yes=args.yes, progress=progress)
         elif args.subcommand == 'delete':
-            labels.DeleteLabel(client, config, args.label)
+            if not args.labels and not args.pattern:
+                print('Error: No labels or patterns specified')
+                args.subparser.print_help()
+                sys.exit(1)
+
+            patterns = [compilePattern(p) for p in args.pattern or []]
+            labels.DeleteLabels(
+                client, config, names=args.labels, patterns=patterns,
+                output=args.output, yes=args.yes, progress=progress)
+        elif args.subcommand == 'rename':
+            if not args.label and not args.pattern:
+                print('Error: No labels or patterns specified')
+                args.subparser.print_help()
+                sys.exit(1)
+
+            patterns = [
+                (compilePattern(p, replacement), replacement)
+                for (p, replacement) in args.pattern or []]
+            labels.RenameLabels(
+                client, config, names=args.label or [], patterns=patterns,
+                output=args.output, yes=args.yes, progress=progress)
         elif args.subcommand == 'search':
-            labels.SearchLabel(client, config, args.pattern)
+            # Validated before any repo or the mirror is fetched.
+            compilePattern(args.pattern)
+            labels.SearchLabel(
+                client, config, args.pattern, local=args.local, refresh=args.refresh,
+                progress=progress)
+        elif args.subcommand == 'query':
+            if args.pattern:
+                compilePattern(args.pattern)
+            labels.QueryLabel(
+                client, config, label=args.label, pattern=args.pattern,
+                refresh=args.refresh, progress=progress)
         else:
             # argparse should prevent this from happening
             print('Unknown subcommand: {}'.format(args.subcommand))
             sys.exit(1)
+    elif args.command == 'mirror':
+        mirror.MirrorCommand(client, config, full=args.full, progress=progress)
     else:
         # argparse should prevent this from happening
         print('Unknown command: {}'.format(args.command))
@@ -62,6 +197,15 @@ def commandParser() -> argparse.ArgumentParser:
             prog=sys.argv[0].split('/')[-1],
             description=CMD_DESC,
             epilog=CMD_EPILOG)
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument(
+            '--record',
+            metavar='FILE',
+            help=CMD_RECORD_HELP)
+    cassette_group.add_argument(
+            '--replay',
+            metavar='FILE',
+            help=CMD_REPLAY_HELP)
     subparsers = parser.add_subparsers()
 
     label_parser = subparsers.add_parser('label', help=LABEL_DESC)
@@ -76,6 +220,20 @@ def commandParser() -> argparse.ArgumentParser:
             '--relabel',
             action='store_true',
             help=LABEL_SYNC_RELABEL_HELP)
+    sync_parser.add_argument(
+            '--state',
+            choices=['open', 'closed', 'all'],
+            help=LABEL_SYNC_STATE_HELP)
+    sync_parser.add_argument(
+            '--since',
+            metavar='DATE',
+            type=dateArgument,
+            help=LABEL_SYNC_SINCE_HELP)
+    sync_parser.add_argument(
+            '--from-repo',
+            metavar='ORG/REPO',
+            help=LABEL_SYNC_FROM_REPO_HELP)
+    addOutputArguments(sync_parser)
 
     search_parser = label_subparsers.add_parser('search', help=LABEL_SEARCH_HELP)
     search_parser.set_defaults(subcommand='search')
@@ -85,8 +243,120 @@ def commandParser() -> argparse.ArgumentParser:
             metavar='PATTERN',
             help=LABEL_SEARCH_PATTERN_HELP,
             required=True)
+    search_parser.add_argument(
+            '-l',
+            '--local',
+            action='store_true',
+            help=LABEL_SEARCH_LOCAL_HELP)
+    search_parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help=LABEL_REFRESH_HELP)
+    addProgressArgument(search_parser)
+
+    query_parser = label_subparsers.add_parser('query', help=LABEL_QUERY_HELP)
+    query_parser.set_defaults(subcommand='query')
+    query_group = query_parser.add_mutually_exclusive_group(required=True)
+    query_group.add_argument(
+            '-n',
+            '--label',
+            metavar='LABEL',
+            help=LABEL_QUERY_LABEL_HELP)
+    query_group.add_argument(
+            '-p',
+            '--pattern',
+            metavar='PATTERN',
+            help=LABEL_QUERY_PATTERN_HELP)
+    query_parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help=LABEL_REFRESH_HELP)
+    addProgressArgument(query_parser)
 
     delete_parser = label_subparsers.add_parser('delete', help=LABEL_DELETE_HELP)
     delete_parser.set_defaults(subcommand='delete')
-    delete_parser.add_argument('label', help=LABEL_DELETE_LABEL_HELP)
+    delete_parser.set_defaults(subparser=delete_parser)
+    delete_parser.add_argument('labels', nargs='*', help=LABEL_DELETE_LABEL_HELP)
+    delete_parser.add_argument(
+            '-p',
+            '--pattern',
+            metavar='PATTERN',
+            action='append',
+            help=LABEL_DELETE_PATTERN_HELP)
+    addOutputArguments(delete_parser)
+
+    rename_parser = label_subparsers.add_parser('rename', help=LABEL_RENAME_HELP)
+    rename_parser.set_defaults(subcommand='rename')
+    rename_parser.set_defaults(subparser=rename_parser)
+    rename_parser.add_argument(
+            '-n',
+            '--label',
+            nargs=2,
+            metavar=('OLD', 'NEW'),
+            action='append',
+            help=LABEL_RENAME_LABEL_HELP)
+    rename_parser.add_argument(
+            '-p',
+            '--pattern',
+            nargs=2,
+            metavar=('PATTERN', 'REPLACEMENT'),
+            action='append',
+            help=LABEL_RENAME_PATTERN_HELP)
+    addOutputArguments(rename_parser)
+
+    mirror_parser = subparsers.add_parser('mirror', help=MIRROR_DESC)
+    mirror_parser.set_defaults(command='mirror')
+    mirror_parser.add_argument(
+            '--full',
+            action='store_true',
+            help=MIRROR_FULL_HELP)
+    addProgressArgument(mirror_parser)
     return parser
+
+
+def compilePattern(pattern: str, replacement: str = None) -> re.Pattern:
+    """ Compiles a case insensitive label pattern, exiting if it or its
+        replacement is invalid.
+    """
+    try:
+        compiled = re.compile(pattern, re.IGNORECASE)
+        if replacement is not None:
+            compiled.sub(replacement, '')
+    except (re.error, IndexError) as e:
+        print('Error: Invalid pattern {}: {}'.format(repr(pattern), e))
+        sys.exit(1)
+
+    return compiled
+
+
+def dateArgument(value: str) -> str:
+    """ Validates an ISO 8601 date or datetime argument. """
+    try:
+        datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'invalid ISO 8601 date: {}'.format(repr(value)))
+
+    return value
+
+
+def addProgressArgument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+            '--no-progress',
+            action='store_true',
+            help=LABEL_NO_PROGRESS_HELP)
+
+
+def addOutputArguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+            '-y',
+            '--yes',
+            action='store_true',
+            help=LABEL_YES_HELP)
+    addProgressArgument(parser)
+    parser.add_argument(
+            '-o',
+            '--output',
+            choices=[output.TEXT, output.NDJSON],
+            default=output.TEXT,
+            help=LABEL_OUTPUT_HELP)
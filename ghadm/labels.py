@@ -1,17 +1,16 @@
+import collections
 import sys
 import math
 import re
-from ghadm.client import Client, Repository, Label
-
-GREEN = '\033[92m'
-RED = '\033[91m'
-END = '\033[0m'
-
-DELETE_LINE = '\033[2K\r'
-
-class ActionUnimplemented(Exception):
-    pass
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from ghadm.client import Client, Repository, Label, MUTATION_BATCH_SIZE
+import ghadm.mirror as mirror
+from ghadm.output import NewOutput, DELETE_LINE, TEXT
+from ghadm.progress import Progress, Paused
 
+# Number of repos fetched at once, unless configured by fetch_concurrency.
+FETCH_CONCURRENCY = 8
 
 class Action:
     def __init__(
@@ -52,11 +51,14 @@ class Action:
         if show_issue_count:
             affected = 0
             if self.extant:
-                affected = len(self.repo.IssuesByLabel(self.extant.id))
+                affected = self.repo.IssueCount(self.extant.id)
             output += ('[' + str(affected) + ']').ljust(6)
           
         output += self.org + '/' + str(self.repo.name)
 
+        if not self.update:
+            return output + '("' + str(self.extant.name) + '")'
+
         update = '('
         if self.extant and self.update.name != self.extant.name:
             update += '"' + str(self.extant.name) + '" -> '
@@ -74,73 +76,267 @@ class Action:
         return output + update
 
 
-    def Execute(self, client: Client):
-        """ Executes the action. """
-        if self.action == 'create':
-            client.CreateLabel(self.repo, self.update)
-        elif self.action == 'edit':
-            client.EditLabel(self.extant, self.update)
-        elif self.action == 'relabel':
-            issues = self.repo.IssuesByLabel(self.extant.id)
-            client.Relabel(issues, self.extant, self.update)
-        else:
-            raise ActionUnimplemented()
-
-
-def Sync(client: Client, config: dict, relabel: bool):
+def Sync(
+        client: Client,
+        config: dict,
+        relabel: bool,
+        issue_filter: dict = None,
+        output: str = TEXT,
+        yes: bool = False,
+        progress: Progress = None):
     """ Syncs labels for all configured repos.
 
         First prints a list of actions that will be executed, then prompts for
-        confirmation before executing the actions.
+        confirmation before executing the actions.  When relabelling, issue and
+        pull request counts are queried for the plan, and the issues and pull
+        requests with each synonym are only fetched once the actions have been
+        confirmed.
 
         Args:
           client: A Client used to connect to the GitHub API.
           config: A dict containing the configuration for the GitHub organization.
-          relabel: Flag indicating whether to merge synonyms and relabel issues.
+          relabel: Flag indicating whether to merge synonyms and relabel issues
+            and pull requests.
+          issue_filter: An optional IssueFilters dict limiting which issues and
+            pull requests are relabelled, see IssueFilter.
+          output: The output format, 'text' or 'ndjson'.
+          yes: Execute the actions without prompting for confirmation.
+          progress: An optional Progress reporting the fetches and actions.
     """
-    repos = {}
-    for repo in config['project_repos']:
-        print('Fetching data for repository: ', end='')
-        print('{}/{}...'.format(config['organization'], repo), end='')
-        sys.stdout.flush()
-        repos[repo] = client.Repository(config['organization'], repo, relabel)
-        print(DELETE_LINE, end='')
+    out = NewOutput(output, show_issue_count=relabel, yes=yes, progress=progress)
 
-    actions = []
-    for repo in repos:
-        actions += GenerateSyncActions(config, repos[repo])
+    def plan(repository: Repository) -> list[Action]:
+        repo_actions = GenerateSyncActions(config, repository)
+
+        extant = [a.extant for a in repo_actions if a.extant]
+        if relabel and extant:
+            repository.issue_counts = client.IssueCounts(
+                config['organization'], repository.name, extant, issue_filter)
 
-    print('The following label actions will be executed:')
+            # Filtered synonyms are kept, so skip those with nothing to relabel.
+            if issue_filter:
+                repo_actions = [
+                    a for a in repo_actions
+                    if a.action != 'relabel' or repository.IssueCount(a.extant.id)]
+
+        return repo_actions
+
+    actions = planRepositories(client, config, out, plan)
+
+    header = ['The following label actions will be executed:']
     if relabel:
-        print('  <action>: [# issues] (label edits)')
+        header.append('  <action>: [# issues and pull requests] (label edits)')
+        if (issue_filter or {}).get('since'):
+            header.append(
+                '  Pull request counts include those updated before {}, which '
+                'are not relabelled.'.format(issue_filter['since']))
+        if issue_filter:
+            header.append(
+                '  Synonyms are removed from the relabelled issues and pull '
+                'requests but kept in the repos, as those outside the filter '
+                'are not relabelled.')
     else:
-        print('  <action>: (label edits)')
-    max_length = 0
-    for a in actions:
-        action_string = a.FormattedString(show_issue_count=relabel)
-        if len(action_string) > max_length:
-            max_length = len(action_string)
-        print('  ' + action_string, end='\n')
+        header.append('  <action>: (label edits)')
+
+    if not out.Confirm(header, 'Confirm {} label actions:'.format(str(len(actions)))):
+        return
+
+    relabels = [a for a in actions if a.action == 'relabel']
+    if not relabel:
+        for a in relabels:
+            out.Executing(a)
+            out.Executed(a, 'skipped')
+        relabels = []
+
+    # Edits and creates are sent as batched mutations across every repo.
+    executeBatched(
+        out,
+        [a for a in actions if a.action == 'edit'],
+        lambda batch: client.EditLabels([(a.extant, a.update) for a in batch]))
+    executeBatched(
+        out,
+        [a for a in actions if a.action == 'create'],
+        lambda batch: client.CreateLabels([(a.repo, a.update) for a in batch]))
+
+    # Relabels are deferred until all other actions have completed so that
+    # every issue and pull request can be relabelled with a single mutation.
+    if relabels:
+        out.Progress('Relabelling issues and pull requests for {} synonyms'.format(
+            str(len(relabels))))
+        try:
+            errors = ExecuteRelabels(client, relabels, issue_filter, progress)
+        except Exception as e:
+            errors = [e] * len(relabels)
+        out.ProgressDone()
+
+        for (r, error) in zip(relabels, errors):
+            out.Executing(r)
+            if error:
+                out.Executed(r, 'failed', error)
+            else:
+                out.Executed(r, 'ok')
+
+
+def TemplateConfig(client: Client, config: dict, template: str) -> dict:
+    """ Returns config with its labels replaced by those of a template repo.
+
+        The template is fetched once.  Synonyms configured for a label with the
+        same name are kept, and the template is removed from the project repos.
+
+        Args:
+          client: A Client used to connect to the GitHub API.
+          config: A dict containing the configuration for the GitHub organization.
+          template: The template repo, as 'org/repo'.
+    """
+    (org, repo) = template.split('/', 1)
+    repository = client.Repository(org, repo, fetch_issues=False)
+
+    cfg_labels = {
+        name.lower(): cfg_label for (name, cfg_label) in config.get('labels', {}).items()}
+
+    labels = {}
+    for label in sorted(repository.labels.values(), key=lambda l: l.name.lower()):
+        labels[label.name] = {
+            'color': label.color,
+            'description': label.description
+        }
+
+        synonyms = cfg_labels.get(label.name.lower(), {}).get('synonyms')
+        if synonyms:
+            labels[label.name]['synonyms'] = synonyms
+
+    repos = [
+        r for r in config['project_repos']
+        if not (org == config['organization'] and r == repository.name)]
+
+    return dict(config, labels=labels, project_repos=repos)
+
+
+def IssueFilter(config: dict, state: str = None, since: str = None) -> dict:
+    """ Builds the IssueFilters which limit the issues and pull requests
+        fetched for relabelling.
+
+        Options given as arguments override the 'relabel' section of the config.
+
+        Args:
+          config: A dict containing the configuration for the GitHub organization.
+          state: One of 'open', 'closed' or 'all'.
+          since: Only issues updated at or after this date, as a date or an ISO
+            8601 string.
+
+        Returns:
+          An IssueFilters dict, or None if every issue should be relabelled.
+    """
+    cfg_relabel = config.get('relabel') or {}
+    state = state or cfg_relabel.get('state', 'all')
+    since = since or cfg_relabel.get('since')
+
+    issue_filter = {}
+    if state != 'all':
+        issue_filter['states'] = [state.upper()]
+    if since:
+        issue_filter['since'] = formatDateTime(since)
+
+    return issue_filter or None
+
+
+def ExecuteRelabels(
+        client: Client,
+        actions: list[Action],
+        issue_filter: dict = None,
+        progress: Progress = None) -> list[Exception]:
+    """ Executes relabel actions, then deletes the merged synonyms.
 
-    print('\nConfirm {} label actions: [y/N]: '.format(str(len(actions))), end='')
+        The issues and pull requests with each synonym are fetched through the
+        synonym's own connections, and each has labels added with at most one
+        mutation regardless of how many of its labels are being merged.  A
+        synonym is only deleted once all of its issues and pull requests have
+        been relabelled.
 
-    i = input().lower()
+        Args:
+          client: A Client used to connect to the GitHub API.
+          actions: A list of relabel Actions, from any number of repos.
+          issue_filter: An optional IssueFilters dict limiting which issues and
+            pull requests are relabelled.  When it is set the synonyms are
+            removed from the relabelled issues and pull requests instead of
+            being deleted, as deleting them would remove them from those
+            outside the filter.
+          progress: An optional Progress updated as each synonym is fetched and
+            each batch of issues and pull requests is updated.
+
+        Returns:
+          The error for each action, in order, or None if it succeeded.
+    """
+    if progress:
+        progress.Relabelling(len(actions))
 
-    if i == 'y' or i == 'yes':
+    errors = {}
+    labelables = {}
+    for a in actions:
         try:
-            for a in actions:
-                action_string = a.FormattedString(show_issue_count=relabel)
-                print('  ' + action_string.ljust(max_length + 2), end='')
-
-                if not relabel and a.action == 'relabel':
-                    print('['+RED+'SKIPPED'+END+']')
-                    continue
-                else:
-                    a.Execute(client)
-                    print('['+GREEN+'OK'+END+']')
+            labelables[a.extant.id] = client.Labelables(
+                a.org, a.repo.name, a.extant.name, issue_filter)
         except Exception as e:
-            print('['+RED+'FAILED'+END+']')
-            traceback.print_exc()
+            errors[a.extant.id] = e
+        if progress:
+            progress.SynonymFetched()
+
+    added = GroupRelabels([a for a in actions if a.extant.id in labelables], labelables)
+    failed = {
+        id: error
+        for (id, error) in zip(added, updateBatched(client.AddLabels, added, progress))
+        if error}
+
+    if issue_filter:
+        removed = {}
+        for a in actions:
+            for id in labelables.get(a.extant.id, []):
+                if id not in failed:
+                    removed.setdefault(id, []).append(a.extant.id)
+
+        for (id, error) in zip(
+                removed, updateBatched(client.RemoveLabels, removed, progress)):
+            if error:
+                failed[id] = error
+
+    for a in actions:
+        for id in labelables.get(a.extant.id, []):
+            if id in failed:
+                errors.setdefault(a.extant.id, failed[id])
+
+    if not issue_filter:
+        deleted = [a.extant for a in actions if a.extant.id not in errors]
+        for (label, error) in zip(deleted, client.DeleteLabels(deleted)):
+            if error:
+                errors[label.id] = error
+
+    return [errors.get(a.extant.id) for a in actions]
+
+
+def GroupRelabels(
+        actions: list[Action],
+        labelables: dict[str, list[str]]) -> dict[str, list[str]]:
+    """ Combines relabel actions into a single label update per issue or pull
+        request.
+
+        Args:
+          actions: A list of relabel Actions.
+          labelables: The ids of the issues and pull requests with each synonym,
+            keyed by the synonym's label id.
+
+        Returns:
+          The ids of the labels to add to each issue or pull request, keyed by
+          its id.
+    """
+    added = {}
+
+    for a in actions:
+        for id in labelables.get(a.extant.id, []):
+            label_ids = added.setdefault(id, [])
+            if a.update.id not in label_ids:
+                label_ids.append(a.update.id)
+
+    return added
 
 
 def GenerateSyncActions(config: dict, repo: Repository) -> list[Action]:
@@ -157,6 +353,7 @@ def GenerateSyncActions(config: dict, repo: Repository) -> list[Action]:
     for cfg_name in config['labels']:
         cfg_label = config['labels'][cfg_name]
         lc_cfg_name = cfg_name.lower()
+        canonical = labels_map.get(lc_cfg_name)
 
         if lc_cfg_name in labels_map:
             # Label already exists.
@@ -203,6 +400,9 @@ def GenerateSyncActions(config: dict, repo: Repository) -> list[Action]:
                     if idx >= 0:
                         action = 'edit'
                         del actions[idx]
+                        # The synonym is renamed to become the configured
+                        # label, so any further synonyms are merged into it.
+                        canonical = labels_map[lc_synonym]
 
                     actions.append(
                         Action(
@@ -211,7 +411,7 @@ def GenerateSyncActions(config: dict, repo: Repository) -> list[Action]:
                             repo,
                             labels_map[lc_synonym],
                             Label(
-                                labels_map[lc_cfg_name].id,
+                                canonical.id,
                                 cfg_name,
                                 cfg_label['description'],
                                 cfg_label['color'])))
@@ -219,72 +419,341 @@ def GenerateSyncActions(config: dict, repo: Repository) -> list[Action]:
     return actions
 
 
-def DeleteLabel(client: Client, config: dict, label: str):
-    """ Deletes a label from all configured repos.
+def DeleteLabels(
+        client: Client,
+        config: dict,
+        names: list[str] = (),
+        patterns: list[re.Pattern] = (),
+        output: str = TEXT,
+        yes: bool = False,
+        progress: Progress = None):
+    """ Deletes labels from all configured repos.
+
+        Every repo is fetched once, then the matching labels are deleted with
+        batched mutations.
 
         Args:
           client: A Client used to connect to the GitHub API.
           config: A dict containing the configuration for the GitHub organization.
-          label: The name of the label to delete.
+          names: The names of labels to delete, matched case insensitively.
+          patterns: Compiled regular expressions matching the names of labels to
+            delete.
+          output: The output format, 'text' or 'ndjson'.
+          yes: Delete the labels without prompting for confirmation.
+          progress: An optional Progress reporting the fetches and deletions.
     """
-    repos = {}
-    for repo in config['project_repos']:
-        print('Fetching data for repository: ', end='')
-        print('{}/{}...'.format(config['organization'], repo), end='')
-        sys.stdout.flush()
-        repos[repo] = client.Repository(config['organization'], repo, fetch_issues=False)
-        print(DELETE_LINE, end='')
+    out = NewOutput(output, yes=yes, progress=progress)
+    lc_names = set(n.lower() for n in names)
 
-    labels = {}
-    for repo in repos:
-        labels_by_lower = repos[repo].LabelsByLowerName()
-        if label.lower() in labels_by_lower:
-            labels[repo] = labels_by_lower[label.lower()]
+    def plan(repository: Repository) -> list[Action]:
+        return [
+            Action('delete', config['organization'], repository, label, None)
+            for label in repository.labels.values()
+            if label.name.lower() in lc_names or any(
+                p.search(label.name) for p in patterns)]
 
-    print('Label "{}" will be deleted from the following repositories:'.format(label))
-    for repo in labels:
-        print('  {}/{}'.format(config['organization'], repo))
+    actions = planRepositories(client, config, out, plan)
 
-    print('\nConfirm deletion from {} repositories: [y/N]: '.format(
-        str(len(labels))), end='')
+    header = ['The following labels will be deleted:']
+    prompt = 'Confirm deletion of {} labels:'.format(str(len(actions)))
 
-    i = input().lower()
+    if not out.Confirm(header, prompt):
+        return
 
-    if i == 'y' or i == 'yes':
-        for repo in labels:
-            try:
-                print('Deleting "{}" from {}/{}'.format(
-                    label, config['organization'], repo).ljust(50), end='')
-                sys.stdout.flush()
-                client.DeleteLabel(labels[repo])
-                print('['+GREEN+'OK'+END+']')
-            except Exception as e:
-                print('['+RED+'FAILED'+END+']')
-                traceback.print_exc()
+    executeBatched(
+        out, actions, lambda batch: client.DeleteLabels([a.extant for a in batch]))
+
+
+def RenameLabels(
+        client: Client,
+        config: dict,
+        names: list[tuple[str, str]] = (),
+        patterns: list[tuple[re.Pattern, str]] = (),
+        output: str = TEXT,
+        yes: bool = False,
+        progress: Progress = None):
+    """ Renames labels in all configured repos.
+
+        Every repo is fetched once, then the matching labels are renamed with
+        batched mutations.  Renames which would collide with another label in
+        the same repo are skipped.
+
+        Args:
+          client: A Client used to connect to the GitHub API.
+          config: A dict containing the configuration for the GitHub organization.
+          names: (name, new name) pairs, with names matched case insensitively.
+          patterns: (compiled pattern, replacement) pairs.  Labels matching the
+            pattern are renamed as re.sub would, eg. ('^legacy-(.*)', r'\1').
+          output: The output format, 'text' or 'ndjson'.
+          yes: Rename the labels without prompting for confirmation.
+          progress: An optional Progress reporting the fetches and renames.
+    """
+    out = NewOutput(output, yes=yes, progress=progress)
+
+    conflicts = []
+
+    def plan(repository: Repository) -> list[Action]:
+        repo_actions = GenerateRenameActions(
+            config['organization'], repository, names, patterns)
+        conflicts.extend(renameConflicts(repository, repo_actions))
 
+        return repo_actions
 
-def SearchLabel(client: Client, config: dict, pattern: str):
+    actions = planRepositories(client, config, out, plan)
+
+    header = ['The following labels will be renamed:']
+    prompt = 'Confirm renaming {} labels:'.format(str(len(actions)))
+
+    if not out.Confirm(header, prompt):
+        return
+
+    for a in conflicts:
+        out.Executing(a)
+        out.Executed(a, 'skipped')
+
+    executeBatched(
+        out,
+        [a for a in actions if a not in conflicts],
+        lambda batch: client.EditLabels([(a.extant, a.update) for a in batch]))
+
+
+def GenerateRenameActions(
+        org: str,
+        repo: Repository,
+        names: list[tuple[str, str]],
+        patterns: list[tuple[re.Pattern, str]]) -> list[Action]:
+    """ Generates an edit action for each label in repo which is renamed.
+
+        Names take precedence over patterns, and the first matching pattern is
+        used.
+    """
+    lc_names = {old.lower(): new for (old, new) in names}
+
+    actions = []
+    for label in repo.labels.values():
+        new_name = lc_names.get(label.name.lower())
+
+        for (pattern, replacement) in patterns:
+            if new_name is not None:
+                break
+
+            (replaced, count) = pattern.subn(replacement, label.name)
+            if count:
+                new_name = replaced
+
+        if new_name and new_name != label.name:
+            actions.append(
+                Action(
+                    'edit',
+                    org,
+                    repo,
+                    label,
+                    Label(label.id, new_name, label.description, label.color)))
+
+    return actions
+
+
+def renameConflicts(repo: Repository, actions: list[Action]) -> list[Action]:
+    """ Returns the rename actions whose new name is already used in repo,
+        either by a label which is not renamed or by another renamed label.
+    """
+    renamed = set(a.extant.id for a in actions)
+    taken = collections.Counter(
+        l.name.lower() for l in repo.labels.values() if l.id not in renamed)
+    taken.update(a.update.name.lower() for a in actions)
+
+    return [a for a in actions if taken[a.update.name.lower()] > 1]
+
+
+def planRepositories(client: Client, config: dict, out, plan) -> list[Action]:
+    """ Fetches every configured repo concurrently and plans actions for each.
+
+        Repos and their actions are reported to out in the configured order.
+
+        Args:
+          client: A Client used to connect to the GitHub API.
+          config: A dict containing the configuration for the GitHub organization.
+          out: The output reporting each repo and action.
+          plan: Returns the Actions for a Repository.  It is called from the
+            fetching thread, so may make further requests for the repo.
+
+        Returns:
+          The planned Actions for every repo.
+    """
+    def fetch(repo: str) -> tuple[Repository, list[Action]]:
+        repository = client.Repository(config['organization'], repo, fetch_issues=False)
+        return (repository, plan(repository))
+
+    actions = []
+    concurrency = config.get('fetch_concurrency', FETCH_CONCURRENCY)
+    out.Planning(config['organization'], config['project_repos'])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [(repo, executor.submit(fetch, repo)) for repo in config['project_repos']]
+
+        for (repo, future) in futures:
+            out.Fetching(config['organization'], repo)
+            (repository, repo_actions) = future.result()
+            out.Fetched(config['organization'], repository)
+
+            for a in repo_actions:
+                out.Planned(a)
+            actions += repo_actions
+
+    return actions
+
+
+def executeBatched(out, actions: list[Action], execute):
+    """ Executes actions in batches of up to MUTATION_BATCH_SIZE.
+
+        Args:
+          out: The output reporting each action.
+          actions: The Actions to execute.
+          execute: Executes a list of Actions with batched mutations, returning
+            the error for each Action or None if it succeeded.
+    """
+    for start in range(0, len(actions), MUTATION_BATCH_SIZE):
+        batch = actions[start:start + MUTATION_BATCH_SIZE]
+
+        out.Progress('Executing {} label actions'.format(str(len(batch))))
+        try:
+            errors = execute(batch)
+        except Exception as e:
+            errors = [e] * len(batch)
+        out.ProgressDone()
+
+        for (a, error) in zip(batch, errors):
+            out.Executing(a)
+            if error:
+                out.Executed(a, 'failed', error)
+            else:
+                out.Executed(a, 'ok')
+
+
+def updateBatched(
+        update,
+        labelables: dict[str, list[str]],
+        progress: Progress = None) -> list[Exception]:
+    """ Updates the labels of issues and pull requests in batches of up to
+        MUTATION_BATCH_SIZE, reporting each batch to progress.
+
+        Args:
+          update: Client.AddLabels or Client.RemoveLabels.
+          labelables: The ids of the labels to update on each issue or pull
+            request, keyed by its id.
+          progress: An optional Progress.
+
+        Returns:
+          The error for each issue or pull request, in order, or None if it
+          succeeded.
+    """
+    if progress:
+        progress.Labelling(len(labelables))
+
+    errors = []
+    items = list(labelables.items())
+    for start in range(0, len(items), MUTATION_BATCH_SIZE):
+        batch = dict(items[start:start + MUTATION_BATCH_SIZE])
+        errors += update(batch)
+        if progress:
+            progress.Labelled(len(batch))
+
+    return errors
+
+
+def SearchLabel(
+        client: Client,
+        config: dict,
+        pattern: str,
+        local: bool = False,
+        refresh: bool = False,
+        progress: Progress = None):
     """ Searches for a label in all configured repos.
 
         Args:
           client: A Client used to connect to the GitHub API.
           config: A dict containing the configuration for the GitHub organization.
           pattern: The pattern to search for.
+          local: Search the local mirror rather than fetching every repo.
+          refresh: Update the local mirror before searching it.
+          progress: An optional Progress reporting the repos fetched.
     """
-    repos = {}
-    for repo in config['project_repos']:
-        print('Fetching data for repository: ', end='')
-        print('{}/{}...'.format(config['organization'], repo), end='')
-        sys.stdout.flush()
-        repos[repo] = client.Repository(config['organization'], repo, fetch_issues=False)
-        print(DELETE_LINE, end='')
+    if local:
+        m = mirror.OpenMirror(config)
+        try:
+            if refresh:
+                mirror.UpdateMirror(client, config, m, progress=progress)
+            repos = m.Repositories(config['organization'], config['project_repos'])
+        finally:
+            m.Close()
+    else:
+        if progress:
+            progress.Fetching(len(config['project_repos']))
+
+        repos = {}
+        for repo in config['project_repos']:
+            if not progress:
+                print('Fetching data for repository: ', end='')
+                print('{}/{}...'.format(config['organization'], repo), end='')
+                sys.stdout.flush()
+
+            repos[repo] = client.Repository(config['organization'], repo, fetch_issues=False)
+
+            if progress:
+                progress.Fetched()
+            else:
+                print(DELETE_LINE, end='')
 
     found_repos = matchRepositories(repos, pattern)
 
-    print('Labels found in the following repositories:')
-    for repo in found_repos:
-        for label in found_repos[repo]:
-            print('  {}/{}: {}'.format(config['organization'], repo, label))
+    with Paused(progress):
+        print('Labels found in the following repositories:')
+        for repo in found_repos:
+            for label in found_repos[repo]:
+                print('  {}/{}: {}'.format(config['organization'], repo, label))
+
+
+def QueryLabel(
+        client: Client,
+        config: dict,
+        label: str = None,
+        pattern: str = None,
+        refresh: bool = False,
+        progress: Progress = None):
+    """ Queries label usage across the organization from the local mirror.
+
+        Prints each repo with a matching label and the number of issues using
+        it, followed by the total across the organization.
+
+        Args:
+          client: A Client used to connect to the GitHub API.
+          config: A dict containing the configuration for the GitHub organization.
+          label: The name of a label to report, matched case insensitively.
+          pattern: A pattern matching the labels to report.
+          refresh: Update the local mirror before querying it.
+          progress: An optional Progress reporting the repos refreshed.
+    """
+    m = mirror.OpenMirror(config)
+    try:
+        if refresh:
+            mirror.UpdateMirror(client, config, m, progress=progress)
+
+        if label:
+            rows = m.LabelUsage(config['organization'], label)
+        else:
+            rows = m.MatchLabels(config['organization'], pattern)
+    finally:
+        m.Close()
+
+    with Paused(progress):
+        print('  <repository>: <label> [# issues]')
+        total = 0
+        for (repo, name, count) in rows:
+            print('  {}/{}: {} [{}]'.format(config['organization'], repo, name, str(count)))
+            total += count
+
+        print('\n{} labels in {} repositories used by {} issues'.format(
+            str(len(rows)), str(len(set(r[0] for r in rows))), str(total)))
 
 
 def matchRepositories(repos: dict, pattern: str) -> dict[str, list[str]]:
@@ -328,3 +797,17 @@ def findAction(actions: list[Action], action: str, label: str) -> int:
         idx += 1
 
     return -1
+
+
+def formatDateTime(value) -> str:
+    """ Formats a date, datetime or ISO 8601 string as a GraphQL DateTime. """
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+
+    if value.tzinfo:
+        value = value.astimezone(datetime.timezone.utc)
+
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
@@ -1,6 +1,102 @@
+import contextlib
+import datetime
+import io
+import json
+import re
 import unittest
 from ghadm.client import Client, Repository, Label, Issue
 import ghadm.labels as labels
+from ghadm.client import MUTATION_BATCH_SIZE
+from ghadm.progress import Progress
+
+class FakeClient:
+    """ Answers Repository from fixed repositories and records label changes.
+
+        Mutations of the ids, or created names, in failing return an error.
+    """
+    def __init__(
+            self,
+            repositories: dict[str, Repository],
+            labelables: dict = None,
+            issue_counts: dict = None):
+        self.repositories = repositories
+        self.labelables = labelables or {}
+        self.issue_counts = issue_counts or {}
+        self.failing = set()
+        self.created = []
+        self.edited = []
+        self.added = []
+        self.deleted = []
+
+    def Repository(self, org: str, repo: str, fetch_issues: bool) -> Repository:
+        return self.repositories[repo]
+
+    def CreateLabels(self, labels: list[tuple[Repository, Label]]):
+        self.created += [(repo.name, label.name) for (repo, label) in labels]
+        return self.errors(label.name for (_, label) in labels)
+
+    def DeleteLabels(self, labels: list[Label]):
+        self.deleted += [l.id for l in labels]
+        return self.errors(l.id for l in labels)
+
+    def EditLabels(self, edits: list[tuple[Label, Label]]):
+        self.edited += [(extant.id, update.name) for (extant, update) in edits]
+        return self.errors(extant.id for (extant, _) in edits)
+
+    def Labelables(self, org: str, repo: str, label: str, issue_filter: dict = None):
+        return self.labelables.get(label, [])
+
+    def IssueCounts(self, org: str, repo: str, labels: list[Label], issue_filter: dict = None):
+        return {l.id: self.issue_counts.get(l.id, 0) for l in labels}
+
+    def AddLabels(self, added: dict[str, list[str]]):
+        self.added += sorted(added.items())
+        return self.errors(added)
+
+    def errors(self, ids) -> list[Exception]:
+        return [
+            Exception('failed: {}'.format(id)) if id in self.failing else None
+            for id in ids]
+
+
+class FakeGraphQLClient(Client):
+    """ A Client which answers label connections from fixed ids and records
+        the inputs of each batched mutation.
+    """
+    def __init__(self, issues: dict[str, list[str]], pull_requests: dict[str, list[str]]):
+        super().__init__('https://x/graphql', token='test_token')
+        self.issues = issues
+        self.pull_requests = pull_requests
+        self.mutations = []
+
+    def execute(self, query, variable_values: dict = None, hedge: bool = False) -> dict:
+        if query.name == 'LabelLabelables':
+            label = variable_values['label']
+            connections = {
+                'issues': self.issues.get(label, []),
+                'pullRequests': self.pull_requests.get(label, [])
+            }
+
+            return {
+                'rateLimit': {'cost': 1},
+                'repository': {
+                    'label': {
+                        connection: {
+                            'nodes': [
+                                {'id': id, 'updatedAt': '2024-01-01T00:00:00Z'}
+                                for id in ids],
+                            'pageInfo': {'hasNextPage': False, 'endCursor': None}
+                        }
+                        for (connection, ids) in connections.items()
+                    }
+                }
+            }
+
+        inputs = [variable_values['i{}'.format(n)] for n in range(len(variable_values))]
+        self.mutations.append((query.name, inputs))
+
+        return {'m{}'.format(n): {'clientMutationId': None} for n in range(len(inputs))}
+
 
 class TestLabels(unittest.TestCase):
 
@@ -203,6 +299,479 @@ class TestLabels(unittest.TestCase):
         self.assertEqual(labels.GenerateSyncActions(config, repository), expected)
     
 
+    def test_generate_sync_actions_merge_synonyms_into_edit(self):
+        config = {
+            'organization': 'test_org_1',
+            'repositories': ['test_repo_id_1'],
+            'labels': {
+                'test_cfg_label_1': {
+                    'color': 'test_cfg_color_1',
+                    'description': 'test_cfg_description_1',
+                    'synonyms': ['test_extant_label_1', 'test_extant_label_2']
+                }
+            }
+        }
+
+        label_1 = self.create_test_label('extant', '1')
+        label_2 = self.create_test_label('extant', '2')
+
+        repository = self.create_test_repository(
+                '1',
+                {
+                    'test_extant_id_1': label_1,
+                    'test_extant_id_2': label_2
+                })
+
+        update_1 = Label(
+            'test_extant_id_1',
+            'test_cfg_label_1',
+            'test_cfg_description_1',
+            'test_cfg_color_1')
+
+        expected = [
+            labels.Action('edit', 'test_org_1', repository, label_1, update_1),
+            labels.Action('relabel', 'test_org_1', repository, label_2, update_1)]
+
+        self.assertEqual(labels.GenerateSyncActions(config, repository), expected)
+
+
+    def test_group_relabels_one_update_per_labelable(self):
+        synonym_1 = self.create_test_label('synonym', '1')
+        synonym_2 = self.create_test_label('synonym', '2')
+        canonical = self.create_test_label('canonical', '1')
+
+        repository = self.create_test_repository(
+                '1',
+                {
+                    'test_synonym_id_1': synonym_1,
+                    'test_synonym_id_2': synonym_2,
+                    'test_canonical_id_1': canonical
+                })
+
+        actions = [
+            labels.Action('relabel', 'test_org_1', repository, synonym_1, canonical),
+            labels.Action('relabel', 'test_org_1', repository, synonym_2, canonical)]
+
+        labelables = {
+            'test_synonym_id_1': ['test_issue_id_1', 'test_pr_id_1'],
+            'test_synonym_id_2': ['test_issue_id_1', 'test_issue_id_2']
+        }
+
+        self.assertEqual(
+            labels.GroupRelabels(actions, labelables),
+            {
+                'test_issue_id_1': ['test_canonical_id_1'],
+                'test_pr_id_1': ['test_canonical_id_1'],
+                'test_issue_id_2': ['test_canonical_id_1']
+            })
+
+
+    def test_execute_relabels(self):
+        repository_1 = self.create_test_repository('1')
+        repository_2 = self.create_test_repository('2')
+        update_1 = self.create_test_label('update', '1')
+
+        actions = [
+            labels.Action(
+                'relabel', 'test_org_1', repository_1,
+                self.create_test_label('extant', '1'), update_1),
+            labels.Action(
+                'relabel', 'test_org_1', repository_1,
+                self.create_test_label('extant', '2'), update_1),
+            labels.Action(
+                'relabel', 'test_org_1', repository_2,
+                self.create_test_label('extant', '3'),
+                self.create_test_label('update', '3'))
+        ]
+
+        client = FakeGraphQLClient(
+            issues={
+                'test_extant_label_1': ['test_issue_id_1', 'test_issue_id_2'],
+                'test_extant_label_2': ['test_issue_id_1']
+            },
+            pull_requests={
+                'test_extant_label_1': ['test_pr_id_1'],
+                'test_extant_label_3': ['test_pr_id_2']
+            })
+        errors = labels.ExecuteRelabels(client, actions)
+
+        self.assertEqual(errors, [None, None, None])
+        self.assertEqual([name for (name, _) in client.mutations], ['AddLabels', 'DeleteLabels'])
+        self.assertEqual(
+            sorted(client.mutations[0][1], key=lambda i: i['labelableId']),
+            [
+                {'labelableId': 'test_issue_id_1', 'labelIds': ['test_update_id_1']},
+                {'labelableId': 'test_issue_id_2', 'labelIds': ['test_update_id_1']},
+                {'labelableId': 'test_pr_id_1', 'labelIds': ['test_update_id_1']},
+                {'labelableId': 'test_pr_id_2', 'labelIds': ['test_update_id_3']}
+            ])
+        self.assertEqual(
+            client.mutations[1][1],
+            [{'id': 'test_extant_id_1'}, {'id': 'test_extant_id_2'}, {'id': 'test_extant_id_3'}])
+
+    def test_execute_relabels_filtered_keeps_synonyms(self):
+        repository = self.create_test_repository('1')
+        action = labels.Action(
+            'relabel',
+            'test_org_1',
+            repository,
+            self.create_test_label('extant', '1'),
+            self.create_test_label('update', '1'))
+
+        client = FakeGraphQLClient(
+            issues={'test_extant_label_1': ['test_issue_id_1']},
+            pull_requests={'test_extant_label_1': ['test_pr_id_1']})
+        errors = labels.ExecuteRelabels(client, [action], {'states': ['OPEN']})
+
+        self.assertEqual(errors, [None])
+        self.assertEqual(
+            [name for (name, _) in client.mutations], ['AddLabels', 'RemoveLabels'])
+        self.assertEqual(
+            sorted(client.mutations[1][1], key=lambda i: i['labelableId']),
+            [
+                {'labelableId': 'test_issue_id_1', 'labelIds': ['test_extant_id_1']},
+                {'labelableId': 'test_pr_id_1', 'labelIds': ['test_extant_id_1']}
+            ])
+
+    def test_execute_relabels_reports_progress(self):
+        repository = self.create_test_repository('1')
+        actions = [
+            labels.Action(
+                'relabel',
+                'test_org_1',
+                repository,
+                self.create_test_label('extant', ordinal),
+                self.create_test_label('update', ordinal))
+            for ordinal in ['1', '2']]
+
+        issues = ['test_issue_id_{}'.format(i) for i in range(MUTATION_BATCH_SIZE + 1)]
+        client = FakeClient({}, labelables={'test_extant_label_1': issues})
+        batches = []
+        client.AddLabels = lambda added: batches.append(len(added)) or [None] * len(added)
+
+        progress = Progress(client, stream=io.StringIO())
+        errors = labels.ExecuteRelabels(client, actions, progress=progress)
+
+        self.assertEqual(errors, [None, None])
+        self.assertEqual(batches, [MUTATION_BATCH_SIZE, 1])
+        self.assertEqual((progress.synonyms_fetched, progress.synonyms), (2, 2))
+        self.assertEqual(
+            (progress.labelables_updated, progress.labelables),
+            (MUTATION_BATCH_SIZE + 1, MUTATION_BATCH_SIZE + 1))
+
+    def test_execute_relabels_failed_synonym_kept(self):
+        repository = self.create_test_repository('1')
+        (failed, relabelled) = [
+            labels.Action(
+                'relabel',
+                'test_org_1',
+                repository,
+                self.create_test_label('extant', ordinal),
+                self.create_test_label('update', ordinal))
+            for ordinal in ['1', '2']]
+
+        client = FakeClient(
+            {},
+            labelables={
+                'test_extant_label_1': ['test_issue_id_1'],
+                'test_extant_label_2': ['test_issue_id_2']
+            })
+        client.failing = {'test_issue_id_1'}
+        errors = labels.ExecuteRelabels(client, [failed, relabelled])
+
+        self.assertEqual(str(errors[0]), 'failed: test_issue_id_1')
+        self.assertEqual(errors[1], None)
+        self.assertEqual(client.deleted, ['test_extant_id_2'])
+
+    def test_formatted_string_issue_count(self):
+        extant = self.create_test_label('extant', '1')
+        update = self.create_test_label('update', '1')
+
+        repository = self.create_test_repository('1')
+        repository.issue_counts = {'test_extant_id_1': 42}
+
+        action = labels.Action('relabel', 'test_org_1', repository, extant, update)
+
+        self.assertIn('[42]', action.FormattedString(show_issue_count=True))
+        self.assertNotIn('[42]', action.FormattedString(show_issue_count=False))
+
+
+    def test_issue_filter_empty(self):
+        self.assertEqual(labels.IssueFilter({}), None)
+
+    def test_issue_filter_config(self):
+        config = {
+            'relabel': {
+                'state': 'closed',
+                'since': datetime.date(2024, 1, 31)
+            }
+        }
+
+        self.assertEqual(
+            labels.IssueFilter(config),
+            {'states': ['CLOSED'], 'since': '2024-01-31T00:00:00Z'})
+
+    def test_issue_filter_arguments_override_config(self):
+        config = {
+            'relabel': {
+                'state': 'closed',
+                'since': '2020-01-01'
+            }
+        }
+
+        self.assertEqual(
+            labels.IssueFilter(config, 'open', '2024-01-31T12:30:00+01:00'),
+            {'states': ['OPEN'], 'since': '2024-01-31T11:30:00Z'})
+
+    def test_issue_filter_all_states(self):
+        self.assertEqual(labels.IssueFilter({'relabel': {'state': 'closed'}}, 'all'), None)
+
+
+    def test_sync_ndjson_yes(self):
+        config = {
+            'organization': 'test_org_1',
+            'project_repos': ['test_repo_name_1'],
+            'labels': {
+                'test_cfg_label_1': {
+                    'color': 'test_cfg_color_1',
+                    'description': 'test_cfg_description_1'
+                }
+            }
+        }
+
+        client = FakeClient({'test_repo_name_1': self.create_test_repository('1')})
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            labels.Sync(client, config, relabel=False, output='ndjson', yes=True)
+
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+        self.assertEqual(
+            [(r['type'], r.get('action'), r.get('status')) for r in records],
+            [
+                ('repository', None, None),
+                ('action', 'create', None),
+                ('confirm', None, None),
+                ('result', 'create', 'ok')
+            ])
+        self.assertEqual(client.created, [('test_repo_name_1', 'test_cfg_label_1')])
+
+    def test_sync_filtered_skips_relabels_without_issues(self):
+        update = self.create_test_label('update', '1')
+        used = self.create_test_label('extant', '1')
+        unused = self.create_test_label('extant', '2')
+        config = {
+            'organization': 'test_org_1',
+            'project_repos': ['test_repo_name_1'],
+            'labels': {
+                update.name: {
+                    'color': update.color,
+                    'description': update.description,
+                    'synonyms': [used.name, unused.name]
+                }
+            }
+        }
+
+        client = FakeClient(
+            {
+                'test_repo_name_1': self.create_test_repository(
+                    '1', {l.id: l for l in [update, used, unused]})
+            },
+            issue_counts={used.id: 2})
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            labels.Sync(
+                client, config, relabel=True, issue_filter={'states': ['OPEN']},
+                output='ndjson')
+
+        self.assertEqual(
+            [
+                (r['action'], r['extant']['id'])
+                for r in map(json.loads, stdout.getvalue().splitlines())
+                if r['type'] == 'action'
+            ],
+            [('relabel', used.id)])
+
+    def test_sync_ndjson_without_yes_plans_only(self):
+        config = {
+            'organization': 'test_org_1',
+            'project_repos': ['test_repo_name_1'],
+            'labels': {
+                'test_cfg_label_1': {
+                    'color': 'test_cfg_color_1',
+                    'description': 'test_cfg_description_1'
+                }
+            }
+        }
+
+        client = FakeClient({'test_repo_name_1': self.create_test_repository('1')})
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            labels.Sync(client, config, relabel=False, output='ndjson')
+
+        self.assertEqual(client.created, [])
+
+    def test_template_config(self):
+        config = {
+            'organization': 'test_org_1',
+            'project_repos': ['test_repo_name_1', 'test_repo_name_2'],
+            'labels': {
+                'TEST_EXTANT_LABEL_1': {
+                    'color': 'test_cfg_color_1',
+                    'description': 'test_cfg_description_1',
+                    'synonyms': ['test_synonym_label_1']
+                },
+                'test_cfg_label_2': {
+                    'color': 'test_cfg_color_2',
+                    'description': 'test_cfg_description_2'
+                }
+            }
+        }
+
+        label_1 = self.create_test_label('extant', '1')
+        client = FakeClient({
+            'test_repo_name_1': self.create_test_repository('1', {label_1.id: label_1})
+        })
+
+        template = labels.TemplateConfig(client, config, 'test_org_1/test_repo_name_1')
+
+        self.assertEqual(template['project_repos'], ['test_repo_name_2'])
+        self.assertEqual(
+            template['labels'],
+            {
+                'test_extant_label_1': {
+                    'color': 'test_extant_color_1',
+                    'description': 'test_extant_description_1',
+                    'synonyms': ['test_synonym_label_1']
+                }
+            })
+        self.assertEqual(config['project_repos'], ['test_repo_name_1', 'test_repo_name_2'])
+
+    def test_sync_plans_repos_in_configured_order(self):
+        config = {
+            'organization': 'test_org_1',
+            'project_repos': ['test_repo_name_{}'.format(n) for n in range(10)],
+            'labels': {
+                'test_cfg_label_1': {
+                    'color': 'test_cfg_color_1',
+                    'description': 'test_cfg_description_1'
+                }
+            }
+        }
+
+        client = FakeClient({
+            repo: self.create_test_repository(repo[-1]) for repo in config['project_repos']})
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            labels.Sync(client, config, relabel=False, output='ndjson', yes=True)
+
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+        self.assertEqual(
+            [r['repo'] for r in records if r['type'] == 'repository'],
+            config['project_repos'])
+        self.assertEqual(
+            client.created,
+            [(repo, 'test_cfg_label_1') for repo in config['project_repos']])
+
+    def test_delete_labels_yes(self):
+        config = {
+            'organization': 'test_org_1',
+            'project_repos': ['test_repo_name_1', 'test_repo_name_2']
+        }
+
+        label_1 = self.create_test_label('extant', '1')
+        label_2 = self.create_test_label('extant', '2')
+        label_3 = self.create_test_label('other', '3')
+
+        client = FakeClient({
+            'test_repo_name_1': self.create_test_repository(
+                '1', {l.id: l for l in [label_1, label_3]}),
+            'test_repo_name_2': self.create_test_repository(
+                '2', {label_2.id: label_2})
+        })
+
+        client.failing = {'test_other_id_3'}
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            labels.DeleteLabels(
+                client,
+                config,
+                names=['TEST_OTHER_LABEL_3'],
+                patterns=[re.compile('extant_label_1$', re.IGNORECASE)],
+                output='ndjson',
+                yes=True)
+
+        results = [
+            (r['extant']['id'], r['status'])
+            for r in map(json.loads, stdout.getvalue().splitlines())
+            if r['type'] == 'result']
+
+        self.assertEqual(client.deleted, ['test_extant_id_1', 'test_other_id_3'])
+        self.assertEqual(
+            results,
+            [('test_extant_id_1', 'ok'), ('test_other_id_3', 'failed')])
+
+    def test_generate_rename_actions(self):
+        label_1 = self.create_test_label('extant', '1')
+        label_2 = self.create_test_label('extant', '2')
+        label_3 = self.create_test_label('other', '3')
+        repository = self.create_test_repository(
+            '1', {l.id: l for l in [label_1, label_2, label_3]})
+
+        actions = labels.GenerateRenameActions(
+            'test_org_1',
+            repository,
+            [('TEST_EXTANT_LABEL_2', 'test_named_label_2')],
+            [(re.compile('^TEST_EXTANT_(.*)', re.IGNORECASE), r'test_renamed_\1')])
+
+        self.assertEqual(
+            [(a.action, a.extant.id, a.update.name) for a in actions],
+            [
+                ('edit', 'test_extant_id_1', 'test_renamed_label_1'),
+                ('edit', 'test_extant_id_2', 'test_named_label_2')
+            ])
+
+    def test_rename_labels_skips_conflicts(self):
+        config = {
+            'organization': 'test_org_1',
+            'project_repos': ['test_repo_name_1']
+        }
+
+        label_1 = self.create_test_label('extant', '1')
+        label_2 = self.create_test_label('extant', '2')
+        label_3 = self.create_test_label('other', '3')
+
+        client = FakeClient({
+            'test_repo_name_1': self.create_test_repository(
+                '1', {l.id: l for l in [label_1, label_2, label_3]})
+        })
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            labels.RenameLabels(
+                client,
+                config,
+                names=[('test_extant_label_1', 'TEST_OTHER_LABEL_3')],
+                patterns=[(re.compile('extant', re.IGNORECASE), 'renamed')],
+                output='ndjson',
+                yes=True)
+
+        results = [
+            (r['extant']['id'], r['status'])
+            for r in map(json.loads, stdout.getvalue().splitlines())
+            if r['type'] == 'result']
+
+        self.assertEqual(client.edited, [('test_extant_id_2', 'test_renamed_label_2')])
+        self.assertEqual(
+            results,
+            [('test_extant_id_1', 'skipped'), ('test_extant_id_2', 'ok')])
+
+
     def create_test_label(self, qualifier: str, ordinal: str):
         return Label(
             'test_{}_id_{}'.format(qualifier, ordinal),
@@ -0,0 +1,38 @@
+import collections
+import math
+import threading
+
+# Number of recent latencies kept for each operation.
+LATENCY_WINDOW = 200
+
+# Percentiles are only reported once this many latencies have been recorded.
+MIN_SAMPLES = 20
+
+class LatencyTracker:
+    """ Records recent request latencies per operation. """
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self.latencies = {}
+        self.lock = threading.Lock()
+
+    def Record(self, operation: str, seconds: float):
+        with self.lock:
+            if operation not in self.latencies:
+                self.latencies[operation] = collections.deque(maxlen=self.window)
+
+            self.latencies[operation].append(seconds)
+
+    def Percentile(self, operation: str, percentile: float) -> float:
+        """ Returns the latency at percentile for operation.
+
+            Returns None until at least min_samples latencies are recorded.
+        """
+        with self.lock:
+            latencies = sorted(self.latencies.get(operation, []))
+
+        if len(latencies) < self.min_samples:
+            return None
+
+        rank = math.ceil(percentile / 100 * len(latencies)) - 1
+        return latencies[max(0, min(rank, len(latencies) - 1))]
@@ -0,0 +1,34 @@
+import unittest
+
+from ghadm.latency import LatencyTracker
+
+class TestLatencyTracker(unittest.TestCase):
+
+    def test_percentile_too_few_samples(self):
+        tracker = LatencyTracker(min_samples=3)
+        tracker.Record('test_operation', 1.0)
+
+        self.assertEqual(tracker.Percentile('test_operation', 50), None)
+
+    def test_percentile(self):
+        tracker = LatencyTracker(min_samples=1)
+        for n in range(1, 101):
+            tracker.Record('test_operation', float(n))
+
+        self.assertEqual(tracker.Percentile('test_operation', 95), 95.0)
+        self.assertEqual(tracker.Percentile('test_operation', 100), 100.0)
+
+    def test_percentile_per_operation(self):
+        tracker = LatencyTracker(min_samples=1)
+        tracker.Record('test_operation_1', 1.0)
+        tracker.Record('test_operation_2', 5.0)
+
+        self.assertEqual(tracker.Percentile('test_operation_1', 50), 1.0)
+        self.assertEqual(tracker.Percentile('test_operation_2', 50), 5.0)
+
+    def test_window(self):
+        tracker = LatencyTracker(window=2, min_samples=1)
+        for seconds in [100.0, 1.0, 2.0]:
+            tracker.Record('test_operation', seconds)
+
+        self.assertEqual(tracker.Percentile('test_operation', 100), 2.0)
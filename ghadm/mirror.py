@@ -0,0 +1,286 @@
+import datetime
+import os
+import re
+import sqlite3
+import sys
+
+from ghadm.client import Client, Repository, Label
+from ghadm.output import DELETE_LINE
+from ghadm.progress import Progress, Paused
+
+DEFAULT_MIRROR_PATH = '~/.ghadm.db'
+
+# Days between full updates of a repo's issues, which remove the issues that
+# have been deleted or transferred since the last full update.
+DEFAULT_FULL_SYNC_DAYS = 7
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS repos (
+      id TEXT PRIMARY KEY,
+      org TEXT NOT NULL,
+      name TEXT NOT NULL,
+      issues_synced_at TEXT,
+      full_synced_at TEXT
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS repos_org_name ON repos (org, name);
+
+    CREATE TABLE IF NOT EXISTS labels (
+      id TEXT PRIMARY KEY,
+      repo_id TEXT NOT NULL,
+      name TEXT NOT NULL,
+      lower_name TEXT NOT NULL,
+      color TEXT,
+      description TEXT
+    );
+    CREATE INDEX IF NOT EXISTS labels_repo ON labels (repo_id);
+    CREATE INDEX IF NOT EXISTS labels_lower_name ON labels (lower_name);
+
+    CREATE TABLE IF NOT EXISTS issues (
+      id TEXT PRIMARY KEY,
+      repo_id TEXT NOT NULL,
+      title TEXT
+    );
+    CREATE INDEX IF NOT EXISTS issues_repo ON issues (repo_id);
+
+    CREATE TABLE IF NOT EXISTS issue_labels (
+      issue_id TEXT NOT NULL,
+      label_id TEXT NOT NULL,
+      PRIMARY KEY (issue_id, label_id)
+    );
+    CREATE INDEX IF NOT EXISTS issue_labels_label ON issue_labels (label_id);
+'''
+
+class Mirror:
+    """ A local SQLite index of repos, labels and issue labels.
+
+        Labels are replaced each time a repo is updated.  Issues are updated
+        incrementally, fetching only those updated since the last update.
+        Incremental updates cannot see deleted or transferred issues, so every
+        full_sync_days the issues are replaced by a full update instead.
+    """
+    def __init__(self, path: str, full_sync_days: float = DEFAULT_FULL_SYNC_DAYS):
+        self.db = sqlite3.connect(os.path.expanduser(path))
+        self.db.create_function('REGEXP', 2, regexp)
+        self.db.executescript(SCHEMA)
+        self.full_sync_interval = datetime.timedelta(days=full_sync_days)
+
+        # Mirrors created before full_synced_at was added.
+        columns = [c[1] for c in self.db.execute('PRAGMA table_info(repos)')]
+        if 'full_synced_at' not in columns:
+            self.db.execute('ALTER TABLE repos ADD COLUMN full_synced_at TEXT')
+
+    def Close(self):
+        self.db.close()
+
+    def Update(
+            self,
+            client: Client,
+            org: str,
+            repo: str,
+            full: bool = False) -> list[str]:
+        """ Updates a repo from GitHub.
+
+            Args:
+              client: A Client used to connect to the GitHub API.
+              org: The organization of the repo.
+              repo: The name of the repo.
+              full: Refetch every issue rather than those updated since the last
+                update.  Also done if the last full update is older than the
+                full sync interval.
+
+            Returns:
+              An error for each issue which has more than MAX_PAGE_SIZE labels.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        synced_at = now.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        (issues_synced_at, full_synced_at) = self.syncedAt(org, repo)
+        if not full_synced_at or parseDateTime(full_synced_at) < now - self.full_sync_interval:
+            full = True
+        since = None if full else issues_synced_at
+
+        repository = client.Repository(
+            org, repo, fetch_issues=True, issue_filter={'since': since} if since else None)
+        (issues, errors) = (repository.issues, repository.errors)
+
+        with self.db:
+            # A repo which was deleted and recreated has a new id.
+            for (old_id,) in self.db.execute(
+                    'SELECT id FROM repos WHERE org = ? AND name = ? AND id != ?',
+                    (org, repository.name, repository.id)).fetchall():
+                self.deleteRepository(old_id)
+
+            self.db.execute(
+                'INSERT INTO repos (id, org, name) VALUES (?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET org = excluded.org, name = excluded.name',
+                (repository.id, org, repository.name))
+
+            self.db.execute('DELETE FROM labels WHERE repo_id = ?', (repository.id,))
+            self.db.executemany(
+                'INSERT INTO labels VALUES (?, ?, ?, ?, ?, ?)',
+                [(l.id, repository.id, l.name, l.name.lower(), l.color, l.description)
+                 for l in repository.labels.values()])
+
+            if full:
+                self.db.execute(
+                    'DELETE FROM issue_labels WHERE issue_id IN '
+                    '(SELECT id FROM issues WHERE repo_id = ?)', (repository.id,))
+                self.db.execute('DELETE FROM issues WHERE repo_id = ?', (repository.id,))
+
+            self.db.executemany(
+                'INSERT OR REPLACE INTO issues VALUES (?, ?, ?)',
+                [(i.id, repository.id, i.title) for i in issues.values()])
+            self.db.executemany(
+                'DELETE FROM issue_labels WHERE issue_id = ?',
+                [(i,) for i in issues])
+            self.db.executemany(
+                'INSERT INTO issue_labels VALUES (?, ?)',
+                [(i.id, l) for i in issues.values() for l in i.labels])
+
+            # Only record the sync if every issue was stored with all its labels.
+            if not errors:
+                self.db.execute(
+                    'UPDATE repos SET issues_synced_at = ? WHERE id = ?',
+                    (synced_at, repository.id))
+                if full:
+                    self.db.execute(
+                        'UPDATE repos SET full_synced_at = ? WHERE id = ?',
+                        (synced_at, repository.id))
+
+        return errors
+
+    def Repositories(self, org: str, repos: list[str]) -> dict[str, Repository]:
+        """ Returns the mirrored repos, with labels and without issues. """
+        result = {}
+
+        for (id, name) in self.db.execute(
+                'SELECT id, name FROM repos WHERE org = ?', (org,)):
+            if name not in repos:
+                continue
+
+            nodes = [
+                {'id': l[0], 'name': l[1], 'color': l[2], 'description': l[3]}
+                for l in self.db.execute(
+                    'SELECT id, name, color, description FROM labels WHERE repo_id = ?',
+                    (id,))]
+
+            result[name] = Repository(id, name, Label.DictFromNodes(nodes), {}, [])
+
+        return result
+
+    def LabelUsage(self, org: str, name: str) -> list[tuple[str, str, int]]:
+        """ Returns the repos with a label and the number of issues using it.
+
+            Labels are matched case insensitively.
+
+            Returns:
+              A list of (repo, label, issue count) tuples ordered by repo.
+        """
+        return self.db.execute(
+            'SELECT r.name, l.name, COUNT(il.issue_id) '
+            'FROM labels l '
+            'JOIN repos r ON r.id = l.repo_id '
+            'LEFT JOIN issue_labels il ON il.label_id = l.id '
+            'WHERE r.org = ? AND l.lower_name = ? '
+            'GROUP BY l.id ORDER BY r.name',
+            (org, name.lower())).fetchall()
+
+    def MatchLabels(self, org: str, pattern: str) -> list[tuple[str, str, int]]:
+        """ Returns the labels matching pattern and the number of issues using
+            each of them.
+
+            Returns:
+              A list of (repo, label, issue count) tuples ordered by repo and
+              label.
+        """
+        return self.db.execute(
+            'SELECT r.name, l.name, COUNT(il.issue_id) '
+            'FROM labels l '
+            'JOIN repos r ON r.id = l.repo_id '
+            'LEFT JOIN issue_labels il ON il.label_id = l.id '
+            'WHERE r.org = ? AND l.name REGEXP ? '
+            'GROUP BY l.id ORDER BY r.name, l.name',
+            (org, pattern)).fetchall()
+
+    def syncedAt(self, org: str, repo: str) -> tuple[str, str]:
+        """ Returns the times of the last update and the last full update. """
+        row = self.db.execute(
+            'SELECT issues_synced_at, full_synced_at FROM repos WHERE org = ? AND name = ?',
+            (org, repo)).fetchone()
+
+        return tuple(row) if row else (None, None)
+
+    def deleteRepository(self, id: str):
+        """ Deletes a repo and its labels and issues. """
+        self.db.execute(
+            'DELETE FROM issue_labels WHERE issue_id IN '
+            '(SELECT id FROM issues WHERE repo_id = ?)', (id,))
+        self.db.execute('DELETE FROM issues WHERE repo_id = ?', (id,))
+        self.db.execute('DELETE FROM labels WHERE repo_id = ?', (id,))
+        self.db.execute('DELETE FROM repos WHERE id = ?', (id,))
+
+
+def regexp(pattern: str, value: str) -> bool:
+    return value is not None and re.search(pattern, value, re.IGNORECASE) is not None
+
+
+def parseDateTime(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def OpenMirror(config: dict) -> Mirror:
+    return Mirror(
+        config.get('mirror_path', DEFAULT_MIRROR_PATH),
+        config.get('mirror_full_sync_days', DEFAULT_FULL_SYNC_DAYS))
+
+
+def UpdateMirror(
+        client: Client,
+        config: dict,
+        mirror: Mirror,
+        full: bool = False,
+        progress: Progress = None):
+    """ Updates the mirror for all configured repos.
+
+        Args:
+          client: A Client used to connect to the GitHub API.
+          config: A dict containing the configuration for the GitHub organization.
+          mirror: The Mirror to update.
+          full: Refetch every issue rather than those updated since the last
+            update.
+          progress: An optional Progress reporting the repos updated, instead
+            of the repo being updated.
+    """
+    if progress:
+        progress.Fetching(len(config['project_repos']))
+
+    for repo in config['project_repos']:
+        if not progress:
+            print('Mirroring repository: ', end='')
+            print('{}/{}...'.format(config['organization'], repo), end='')
+            sys.stdout.flush()
+
+        errors = mirror.Update(client, config['organization'], repo, full)
+
+        if progress:
+            progress.Fetched()
+        else:
+            print(DELETE_LINE, end='')
+
+        with Paused(progress):
+            for error in errors:
+                print(error)
+
+
+def MirrorCommand(client: Client, config: dict, full: bool, progress: Progress = None):
+    """ Updates the mirror for all configured repos and prints a summary. """
+    mirror = OpenMirror(config)
+    try:
+        UpdateMirror(client, config, mirror, full, progress)
+
+        repos = mirror.Repositories(config['organization'], config['project_repos'])
+        with Paused(progress):
+            print('Mirrored {} repositories to {}'.format(
+                str(len(repos)), config.get('mirror_path', DEFAULT_MIRROR_PATH)))
+    finally:
+        mirror.Close()
@@ -0,0 +1,186 @@
+import contextlib
+import io
+import unittest
+
+from ghadm.client import Repository, Label, Issue
+from ghadm.mirror import Mirror, UpdateMirror
+from ghadm.output import DELETE_LINE
+
+class FakeClient:
+    """ Answers Repository from fixed data, recording issue filters. """
+    def __init__(self, labels: dict[str, Label], issues: dict[str, Issue]):
+        self.labels = labels
+        self.issues = issues
+        self.issue_filters = []
+        self.repo_id_prefix = 'test_repo_id_'
+
+    def Repository(
+            self,
+            org: str,
+            repo: str,
+            fetch_issues: bool,
+            issue_filter: dict = None) -> Repository:
+        self.issue_filters.append(issue_filter)
+        return Repository(
+            self.repo_id_prefix + repo, repo, self.labels, self.issues, [])
+
+
+class FakeProgress:
+    """ Records the repos reported and whether it was paused. """
+    def __init__(self):
+        self.repos = 0
+        self.repos_fetched = 0
+        self.paused = 0
+
+    def Fetching(self, repos: int):
+        self.repos = repos
+
+    def Fetched(self):
+        self.repos_fetched += 1
+
+    def Pause(self):
+        self.paused += 1
+
+    def Resume(self):
+        self.paused -= 1
+
+
+class TestMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.mirror = Mirror(':memory:')
+
+    def tearDown(self):
+        self.mirror.Close()
+
+    def test_label_usage(self):
+        bug = self.create_test_label('1', 'Bug')
+        debt = self.create_test_label('2', 'tech debt')
+
+        client = FakeClient(
+            {bug.id: bug, debt.id: debt},
+            {
+                'test_issue_id_1': self.create_test_issue('1', [bug, debt]),
+                'test_issue_id_2': self.create_test_issue('2', [bug])
+            })
+        self.mirror.Update(client, 'test_org', 'repo_1')
+        other_bug = self.create_test_label('3', 'bug')
+        self.mirror.Update(FakeClient({other_bug.id: other_bug}, {}), 'test_org', 'repo_2')
+
+        self.assertEqual(
+            self.mirror.LabelUsage('test_org', 'bug'),
+            [('repo_1', 'Bug', 2), ('repo_2', 'bug', 0)])
+
+    def test_match_labels(self):
+        bug = self.create_test_label('1', 'Bug')
+        debt = self.create_test_label('2', 'tech debt')
+
+        client = FakeClient(
+            {bug.id: bug, debt.id: debt},
+            {'test_issue_id_1': self.create_test_issue('1', [debt])})
+        self.mirror.Update(client, 'test_org', 'repo_1')
+
+        self.assertEqual(
+            self.mirror.MatchLabels('test_org', 'DEBT'),
+            [('repo_1', 'tech debt', 1)])
+
+    def test_update_incremental(self):
+        bug = self.create_test_label('1', 'Bug')
+        client = FakeClient(
+            {bug.id: bug},
+            {'test_issue_id_1': self.create_test_issue('1', [bug])})
+
+        self.mirror.Update(client, 'test_org', 'repo_1')
+        client.issues = {'test_issue_id_2': self.create_test_issue('2', [bug])}
+        self.mirror.Update(client, 'test_org', 'repo_1')
+
+        self.assertEqual(client.issue_filters[0], None)
+        self.assertIn('since', client.issue_filters[1])
+        self.assertEqual(
+            self.mirror.LabelUsage('test_org', 'Bug'), [('repo_1', 'Bug', 2)])
+
+    def test_update_relabelled_issue(self):
+        bug = self.create_test_label('1', 'Bug')
+        debt = self.create_test_label('2', 'tech debt')
+        client = FakeClient(
+            {bug.id: bug, debt.id: debt},
+            {'test_issue_id_1': self.create_test_issue('1', [bug])})
+
+        self.mirror.Update(client, 'test_org', 'repo_1')
+        client.issues = {'test_issue_id_1': self.create_test_issue('1', [debt])}
+        self.mirror.Update(client, 'test_org', 'repo_1')
+
+        self.assertEqual(
+            self.mirror.LabelUsage('test_org', 'Bug'), [('repo_1', 'Bug', 0)])
+
+    def test_update_recreated_repo_removes_old_rows(self):
+        bug = self.create_test_label('1', 'Bug')
+        client = FakeClient(
+            {bug.id: bug},
+            {'test_issue_id_1': self.create_test_issue('1', [bug])})
+        self.mirror.Update(client, 'test_org', 'repo_1')
+
+        debt = self.create_test_label('2', 'tech debt')
+        client = FakeClient({debt.id: debt}, {})
+        client.repo_id_prefix = 'test_new_repo_id_'
+        self.mirror.Update(client, 'test_org', 'repo_1')
+
+        self.assertEqual(self.mirror.LabelUsage('test_org', 'Bug'), [])
+        for table in ['repos', 'labels', 'issues', 'issue_labels']:
+            self.assertEqual(
+                self.mirror.db.execute('SELECT COUNT(*) FROM ' + table).fetchone()[0],
+                0 if table.startswith('issue') else 1)
+
+    def test_update_full_after_interval(self):
+        bug = self.create_test_label('1', 'Bug')
+        client = FakeClient(
+            {bug.id: bug},
+            {'test_issue_id_1': self.create_test_issue('1', [bug])})
+        self.mirror.Update(client, 'test_org', 'repo_1')
+
+        self.mirror.db.execute(
+            "UPDATE repos SET full_synced_at = '2000-01-01T00:00:00Z'")
+        client.issues = {}
+        self.mirror.Update(client, 'test_org', 'repo_1')
+        self.mirror.Update(client, 'test_org', 'repo_1')
+
+        self.assertEqual(client.issue_filters[1], None)
+        self.assertIn('since', client.issue_filters[2])
+        self.assertEqual(
+            self.mirror.LabelUsage('test_org', 'Bug'), [('repo_1', 'Bug', 0)])
+
+    def test_update_mirror_progress(self):
+        config = {'organization': 'test_org', 'project_repos': ['repo_1', 'repo_2']}
+        progress = FakeProgress()
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            UpdateMirror(FakeClient({}, {}), config, self.mirror, progress=progress)
+
+        self.assertEqual((progress.repos, progress.repos_fetched), (2, 2))
+        self.assertEqual(progress.paused, 0)
+        self.assertNotIn(DELETE_LINE, stdout.getvalue())
+
+    def test_repositories(self):
+        bug = self.create_test_label('1', 'Bug')
+        self.mirror.Update(FakeClient({bug.id: bug}, {}), 'test_org', 'repo_1')
+        self.mirror.Update(FakeClient({}, {}), 'test_org', 'repo_2')
+
+        repos = self.mirror.Repositories('test_org', ['repo_1'])
+
+        self.assertEqual(
+            repos,
+            {'repo_1': Repository('test_repo_id_repo_1', 'repo_1', {bug.id: bug}, {}, [])})
+
+    def create_test_label(self, ordinal: str, name: str):
+        return Label(
+            'test_label_id_{}'.format(ordinal),
+            name,
+            'test_description_{}'.format(ordinal),
+            'test_color_{}'.format(ordinal))
+
+    def create_test_issue(self, ordinal: str, labels: list[Label]):
+        return Issue(
+            'test_issue_id_{}'.format(ordinal),
+            'test_issue_title_{}'.format(ordinal),
+            {l.id: l for l in labels})
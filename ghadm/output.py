@@ -0,0 +1,240 @@
+import json
+import sys
+import traceback
+
+from ghadm.client import Repository, Label
+
+GREEN = '\033[92m'
+RED = '\033[91m'
+END = '\033[0m'
+
+DELETE_LINE = '\033[2K\r'
+
+TEXT = 'text'
+NDJSON = 'ndjson'
+
+class TextOutput:
+    """ Human readable output for commands which plan and execute actions.
+
+        Planned actions are listed together once every repo has been fetched,
+        so that results can be aligned, and are confirmed interactively unless
+        yes is set.
+    """
+    def __init__(self, show_issue_count: bool = False, yes: bool = False):
+        self.show_issue_count = show_issue_count
+        self.yes = yes
+        self.actions = []
+        self.max_length = 0
+
+    def Planning(self, org: str, repos: list[str]):
+        pass
+
+    def Fetching(self, org: str, repo: str):
+        print('Fetching data for repository: ', end='')
+        print('{}/{}...'.format(org, repo), end='')
+        sys.stdout.flush()
+
+    def Fetched(self, org: str, repo: Repository):
+        print(DELETE_LINE, end='')
+
+    def Planned(self, action):
+        self.actions.append(action)
+
+    def Confirm(self, header: list[str], prompt: str) -> bool:
+        """ Lists the planned actions and asks for confirmation. """
+        for line in header:
+            print(line)
+
+        for a in self.actions:
+            action_string = a.FormattedString(show_issue_count=self.show_issue_count)
+            if len(action_string) > self.max_length:
+                self.max_length = len(action_string)
+            print('  ' + action_string, end='\n')
+
+        print('\n' + prompt + ' [y/N]: ', end='')
+
+        if self.yes:
+            print('y')
+            return True
+
+        i = input().lower()
+        return i == 'y' or i == 'yes'
+
+    def Progress(self, message: str):
+        print('  ' + message + '...', end='')
+        sys.stdout.flush()
+
+    def ProgressDone(self):
+        print(DELETE_LINE, end='')
+
+    def Executing(self, action):
+        action_string = action.FormattedString(show_issue_count=self.show_issue_count)
+        print('  ' + action_string.ljust(self.max_length + 2), end='')
+        sys.stdout.flush()
+
+    def Executed(self, action, status: str, error: Exception = None):
+        """ Reports the status of an action after Executing it. """
+        if status == 'ok':
+            print('['+GREEN+'OK'+END+']')
+        elif status == 'skipped':
+            print('['+RED+'SKIPPED'+END+']')
+        else:
+            print('['+RED+'FAILED'+END+']')
+            traceback.print_exception(type(error), error, error.__traceback__)
+
+
+class NdjsonOutput:
+    """ Streams one JSON record per line as soon as each is available.
+
+        Records have a 'type' of 'repository', 'action', 'confirm' or 'result'.
+        Without yes nothing is executed, so the plan can be inspected first.
+    """
+    def __init__(self, show_issue_count: bool = False, yes: bool = False, stream=None):
+        self.show_issue_count = show_issue_count
+        self.yes = yes
+        self.stream = stream or sys.stdout
+
+    def emit(self, record: dict):
+        self.stream.write(json.dumps(record) + '\n')
+        self.stream.flush()
+
+    def Planning(self, org: str, repos: list[str]):
+        pass
+
+    def Fetching(self, org: str, repo: str):
+        pass
+
+    def Fetched(self, org: str, repo: Repository):
+        self.emit({
+            'type': 'repository',
+            'org': org,
+            'repo': repo.name,
+            'id': repo.id,
+            'labels': len(repo.labels)
+        })
+
+    def Planned(self, action):
+        self.emit(dict(actionRecord(action, self.show_issue_count), type='action'))
+
+    def Confirm(self, header: list[str], prompt: str) -> bool:
+        self.emit({'type': 'confirm', 'confirmed': self.yes})
+        return self.yes
+
+    def Progress(self, message: str):
+        pass
+
+    def ProgressDone(self):
+        pass
+
+    def Executing(self, action):
+        pass
+
+    def Executed(self, action, status: str, error: Exception = None):
+        record = dict(actionRecord(action, self.show_issue_count), type='result')
+        record['status'] = status
+        if error:
+            record['error'] = str(error)
+
+        self.emit(record)
+
+
+class ProgressOutput:
+    """ Wraps an output, reporting to a ghadm.progress.Progress.
+
+        The status line of the Progress replaces the in place fetching and
+        progress lines of the wrapped output.  It is cleared while the wrapped
+        output writes anything else.
+    """
+    def __init__(self, output, progress):
+        self.output = output
+        self.progress = progress
+
+    def paused(self, fn, *args):
+        self.progress.Pause()
+        try:
+            return fn(*args)
+        finally:
+            self.progress.Resume()
+
+    def Planning(self, org: str, repos: list[str]):
+        self.progress.Fetching(len(repos))
+        self.output.Planning(org, repos)
+
+    def Fetching(self, org: str, repo: str):
+        pass
+
+    def Fetched(self, org: str, repo: Repository):
+        self.progress.Fetched()
+        self.paused(self.output.Fetched, org, repo)
+
+    def Planned(self, action):
+        self.progress.Planned()
+        self.paused(self.output.Planned, action)
+
+    def Confirm(self, header: list[str], prompt: str) -> bool:
+        return self.paused(self.output.Confirm, header, prompt)
+
+    def Progress(self, message: str):
+        pass
+
+    def ProgressDone(self):
+        pass
+
+    def Executing(self, action):
+        # The status line stays cleared until the action's result is written.
+        self.progress.Executing()
+        self.progress.Pause()
+        self.output.Executing(action)
+
+    def Executed(self, action, status: str, error: Exception = None):
+        try:
+            self.output.Executed(action, status, error)
+        finally:
+            self.progress.Executed()
+            self.progress.Resume()
+
+
+def NewOutput(
+        output: str,
+        show_issue_count: bool = False,
+        yes: bool = False,
+        progress=None):
+    """ Returns the output for an --output format, reporting to progress if
+        one is given.
+    """
+    if output == NDJSON:
+        out = NdjsonOutput(show_issue_count, yes)
+    else:
+        out = TextOutput(show_issue_count, yes)
+
+    if progress:
+        return ProgressOutput(out, progress)
+
+    return out
+
+
+def actionRecord(action, show_issue_count: bool) -> dict:
+    record = {
+        'action': action.action,
+        'org': action.org,
+        'repo': action.repo.name,
+        'extant': labelRecord(action.extant),
+        'update': labelRecord(action.update)
+    }
+
+    if show_issue_count and action.extant:
+        record['issues'] = action.repo.IssueCount(action.extant.id)
+
+    return record
+
+
+def labelRecord(label: Label) -> dict:
+    if not label:
+        return None
+
+    return {
+        'id': label.id,
+        'name': label.name,
+        'color': label.color,
+        'description': label.description
+    }
@@ -0,0 +1,103 @@
+import asyncio
+
+import aiohttp
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+
+MIN_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+# Nested connections start small and grow to twice the densest page seen.
+MIN_NESTED_PAGE_SIZE = 5
+INITIAL_NESTED_PAGE_SIZE = 20
+
+# Pages answered faster than this, for at most one point, are considered light
+# and the page size is doubled.  Pages slower than SLOW_SECONDS are halved.
+FAST_SECONDS = 1.0
+SLOW_SECONDS = 5.0
+
+# Number of times a page is retried with smaller sizes after a timeout or 502.
+PAGE_RETRIES = 4
+
+TRANSIENT_STATUS_CODES = (502, 503, 504)
+
+class PageSizer:
+    """ Chooses the page size for one connection from earlier pages.
+
+        The size shrinks after timeouts, bad gateways and slow pages, and grows
+        when pages come back quickly and cheaply.
+    """
+    def __init__(
+            self,
+            size: int = MAX_PAGE_SIZE,
+            minimum: int = MIN_PAGE_SIZE,
+            maximum: int = MAX_PAGE_SIZE):
+        self.size = size
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def __repr__(self):
+        return 'PageSizer<{}, {}, {}>'.format(
+            repr(self.size),
+            repr(self.minimum),
+            repr(self.maximum))
+
+    def Size(self) -> int:
+        return self.size
+
+    def Observe(self, cost: int, seconds: float):
+        """ Adjusts the size given the cost and latency of the last page. """
+        if seconds > SLOW_SECONDS:
+            self.size = max(self.minimum, self.size // 2)
+        elif seconds < FAST_SECONDS and (cost or 0) <= 1:
+            self.size = min(self.maximum, self.size * 2)
+
+    def Failed(self):
+        """ Shrinks the size after a page timed out or failed transiently. """
+        self.size = max(self.minimum, self.size // 2)
+
+
+class NestedPageSizer(PageSizer):
+    """ Chooses the page size for a connection nested in each node of a page.
+
+        The size follows the density actually observed, eg. the number of
+        labels per issue, rather than the latency of the page.
+    """
+    def __init__(self):
+        super().__init__(
+            INITIAL_NESTED_PAGE_SIZE, MIN_NESTED_PAGE_SIZE, MAX_PAGE_SIZE)
+        self.densest = 0
+
+    def Observe(self, cost: int, seconds: float):
+        pass
+
+    def ObserveDensity(self, counts: list[int]):
+        """ Resizes to twice the largest number of nested nodes seen so far. """
+        self.densest = max([self.densest] + counts)
+        self.size = max(self.minimum, min(self.maximum, self.densest * 2))
+
+    def Overflowed(self) -> bool:
+        """ Grows to the maximum after a node had more nested nodes than a page.
+
+            Returns whether the page should be fetched again.
+        """
+        if self.size >= self.maximum:
+            return False
+
+        self.size = self.maximum
+        return True
+
+
+def IsTransient(e: Exception) -> bool:
+    """ Returns whether e is a timeout or gateway error worth retrying. """
+    if isinstance(e, (asyncio.TimeoutError, aiohttp.ServerTimeoutError)):
+        return True
+
+    if isinstance(e, TransportServerError):
+        return e.code in TRANSIENT_STATUS_CODES
+
+    if isinstance(e, TransportQueryError):
+        # GitHub reports queries which exceed its time limit as a query error.
+        return any('timeout' in str(error.get('message', '')).lower()
+                   for error in e.errors or [])
+
+    return False
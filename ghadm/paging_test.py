@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+
+from ghadm.paging import PageSizer, NestedPageSizer, IsTransient
+from ghadm.paging import MIN_PAGE_SIZE, MAX_PAGE_SIZE, MIN_NESTED_PAGE_SIZE
+
+class TestPageSizer(unittest.TestCase):
+
+    def test_failed_halves(self):
+        sizer = PageSizer()
+        sizer.Failed()
+
+        self.assertEqual(sizer.Size(), MAX_PAGE_SIZE // 2)
+
+    def test_failed_minimum(self):
+        sizer = PageSizer(MIN_PAGE_SIZE)
+        sizer.Failed()
+
+        self.assertEqual(sizer.Size(), MIN_PAGE_SIZE)
+
+    def test_observe_slow_page_shrinks(self):
+        sizer = PageSizer()
+        sizer.Observe(1, 10.0)
+
+        self.assertEqual(sizer.Size(), MAX_PAGE_SIZE // 2)
+
+    def test_observe_light_page_grows(self):
+        sizer = PageSizer(20)
+        sizer.Observe(1, 0.2)
+
+        self.assertEqual(sizer.Size(), 40)
+
+    def test_observe_light_page_maximum(self):
+        sizer = PageSizer(80)
+        sizer.Observe(1, 0.2)
+
+        self.assertEqual(sizer.Size(), MAX_PAGE_SIZE)
+
+    def test_observe_expensive_page_unchanged(self):
+        sizer = PageSizer(20)
+        sizer.Observe(5, 0.2)
+
+        self.assertEqual(sizer.Size(), 20)
+
+
+class TestNestedPageSizer(unittest.TestCase):
+
+    def test_observe_density(self):
+        sizer = NestedPageSizer()
+        sizer.ObserveDensity([1, 3, 2])
+
+        self.assertEqual(sizer.Size(), 6)
+
+    def test_observe_density_keeps_densest(self):
+        sizer = NestedPageSizer()
+        sizer.ObserveDensity([8])
+        sizer.ObserveDensity([1])
+
+        self.assertEqual(sizer.Size(), 16)
+
+    def test_observe_density_minimum(self):
+        sizer = NestedPageSizer()
+        sizer.ObserveDensity([0, 0])
+
+        self.assertEqual(sizer.Size(), MIN_NESTED_PAGE_SIZE)
+
+    def test_overflowed(self):
+        sizer = NestedPageSizer()
+
+        self.assertTrue(sizer.Overflowed())
+        self.assertEqual(sizer.Size(), MAX_PAGE_SIZE)
+        self.assertFalse(sizer.Overflowed())
+
+
+class TestIsTransient(unittest.TestCase):
+
+    def test_timeout(self):
+        self.assertTrue(IsTransient(asyncio.TimeoutError()))
+
+    def test_bad_gateway(self):
+        self.assertTrue(IsTransient(TransportServerError('Bad Gateway', 502)))
+
+    def test_unauthorized(self):
+        self.assertFalse(IsTransient(TransportServerError('Unauthorized', 401)))
+
+    def test_query_timeout(self):
+        e = TransportQueryError(
+            'timeout', errors=[{'message': 'Timeout on validation of query'}])
+
+        self.assertTrue(IsTransient(e))
+
+    def test_query_error(self):
+        e = TransportQueryError(
+            'not found', errors=[{'message': 'Could not resolve to a Repository'}])
+
+        self.assertFalse(IsTransient(e))
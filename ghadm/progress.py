@@ -0,0 +1,215 @@
+import collections
+import contextlib
+import shutil
+import sys
+import threading
+import time
+
+from ghadm.output import DELETE_LINE
+
+# Seconds between redraws of the status line on a TTY.
+TTY_INTERVAL = 0.5
+
+# Seconds between status lines when stderr is not a TTY.
+LOG_INTERVAL = 30
+
+# Seconds of history used to measure the page rate.
+RATE_WINDOW = 10
+
+class Progress:
+    """ Reports the progress of a long running command on stderr.
+
+        On a TTY a status line is redrawn in place, otherwise a status line is
+        logged periodically.  The status shows repos fetched, the page rate,
+        actions executed, requests in flight, the remaining rate limit budget
+        and an estimate of the time remaining.  While relabelling it also
+        shows the synonyms fetched and the issues and pull requests updated.
+    """
+    def __init__(self, client, stream=None, interval: float = None):
+        self.client = client
+        self.stream = stream or sys.stderr
+        self.tty = self.stream.isatty()
+        self.interval = interval or (TTY_INTERVAL if self.tty else LOG_INTERVAL)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.paused = 0
+        self.drawn = False
+
+        self.repos = 0
+        self.repos_fetched = 0
+        self.actions = 0
+        self.actions_executed = 0
+        self.synonyms = 0
+        self.synonyms_fetched = 0
+        self.labelables = 0
+        self.labelables_updated = 0
+        self.phase_started = time.monotonic()
+        self.pages = collections.deque()
+
+    def Start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def Stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+
+        with self.lock:
+            self.clear()
+
+    def Fetching(self, repos: int):
+        """ Starts the fetch phase for a number of repos. """
+        with self.lock:
+            self.repos = repos
+            self.repos_fetched = 0
+            self.phase_started = time.monotonic()
+
+    def Fetched(self):
+        with self.lock:
+            self.repos_fetched += 1
+
+    def Planned(self):
+        with self.lock:
+            self.actions += 1
+
+    def Executing(self):
+        """ Starts the execute phase, once the first action is executed. """
+        with self.lock:
+            if not self.actions_executed:
+                self.phase_started = time.monotonic()
+
+    def Executed(self):
+        with self.lock:
+            self.actions_executed += 1
+
+    def Relabelling(self, synonyms: int):
+        """ Starts the relabel phase for a number of synonyms. """
+        with self.lock:
+            self.synonyms = synonyms
+            self.synonyms_fetched = 0
+            self.labelables = 0
+            self.labelables_updated = 0
+            self.phase_started = time.monotonic()
+
+    def SynonymFetched(self):
+        with self.lock:
+            self.synonyms_fetched += 1
+
+    def Labelling(self, labelables: int):
+        """ Adds issues and pull requests to be updated while relabelling,
+            starting the update phase with the first of them.
+        """
+        with self.lock:
+            if not self.labelables:
+                self.phase_started = time.monotonic()
+            self.labelables += labelables
+
+    def Labelled(self, labelables: int):
+        with self.lock:
+            self.labelables_updated += labelables
+
+    def Pause(self):
+        """ Clears the status line until Resume, eg. while prompting. """
+        with self.lock:
+            self.paused += 1
+            self.clear()
+
+    def Resume(self):
+        with self.lock:
+            self.paused -= 1
+
+    def Status(self) -> str:
+        """ Returns the current status line. """
+        stats = self.client.Stats()
+        now = time.monotonic()
+
+        with self.lock:
+            self.pages.append((now, stats['pages']))
+            while len(self.pages) > 2 and self.pages[0][0] < now - RATE_WINDOW:
+                self.pages.popleft()
+
+            (since, pages) = self.pages[0]
+            page_rate = (stats['pages'] - pages) / (now - since) if now > since else 0.0
+
+            if self.labelables:
+                (done, total) = (self.labelables_updated, self.labelables)
+            elif self.synonyms:
+                (done, total) = (self.synonyms_fetched, self.synonyms)
+            elif self.actions_executed:
+                (done, total) = (self.actions_executed, self.actions)
+            else:
+                (done, total) = (self.repos_fetched, self.repos)
+            eta = estimate(done, total, now - self.phase_started)
+
+            relabels = ''
+            if self.synonyms:
+                relabels = ' | relabel {}/{} synonyms, {}/{} items'.format(
+                    self.synonyms_fetched,
+                    self.synonyms,
+                    self.labelables_updated,
+                    self.labelables)
+
+            return ('repos {}/{} | {:.1f} pages/s | actions {}/{}{} | '
+                    '{} in flight | budget {} | ETA {}').format(
+                self.repos_fetched,
+                self.repos,
+                page_rate,
+                self.actions_executed,
+                self.actions,
+                relabels,
+                stats['in_flight'],
+                self.client.pool.Remaining(),
+                eta)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            status = self.Status()
+
+            with self.lock:
+                if self.paused:
+                    continue
+
+                if self.tty:
+                    width = shutil.get_terminal_size().columns
+                    self.stream.write(DELETE_LINE + status[:width - 1])
+                    self.drawn = True
+                else:
+                    self.stream.write(
+                        time.strftime('%H:%M:%S') + ' progress: ' + status + '\n')
+                self.stream.flush()
+
+    def clear(self):
+        if self.drawn:
+            self.stream.write(DELETE_LINE)
+            self.stream.flush()
+            self.drawn = False
+
+
+@contextlib.contextmanager
+def Paused(progress: Progress):
+    """ Clears the status line of progress, if any, while the block writes to
+        the terminal.
+    """
+    if progress:
+        progress.Pause()
+    try:
+        yield
+    finally:
+        if progress:
+            progress.Resume()
+
+
+def estimate(done: int, total: int, seconds: float) -> str:
+    """ Formats the time remaining if progress continues at the same rate. """
+    if not done or total <= done:
+        return '--'
+
+    remaining = int(seconds / done * (total - done))
+    if remaining >= 3600:
+        return '{}h{:02d}m'.format(remaining // 3600, remaining % 3600 // 60)
+    if remaining >= 60:
+        return '{}m{:02d}s'.format(remaining // 60, remaining % 60)
+
+    return '{}s'.format(remaining)
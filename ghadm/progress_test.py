@@ -0,0 +1,112 @@
+import collections
+import io
+import time
+import unittest
+
+from ghadm.output import ProgressOutput
+from ghadm.progress import Progress, estimate
+
+class FakePool:
+    def Remaining(self) -> int:
+        return 4200
+
+
+class FakeClient:
+    """ Reports fixed request statistics. """
+    def __init__(self):
+        self.pool = FakePool()
+        self.stats = collections.Counter({'pages': 0, 'in_flight': 3})
+
+    def Stats(self) -> collections.Counter:
+        return collections.Counter(self.stats)
+
+
+class FakeOutput:
+    """ Records the calls forwarded to it. """
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append(name)
+
+
+class TestProgress(unittest.TestCase):
+
+    def test_estimate(self):
+        self.assertEqual(estimate(0, 10, 5.0), '--')
+        self.assertEqual(estimate(10, 10, 5.0), '--')
+        self.assertEqual(estimate(5, 10, 5.0), '5s')
+        self.assertEqual(estimate(1, 10, 20.0), '3m00s')
+        self.assertEqual(estimate(1, 200, 60.0), '3h19m')
+
+    def test_status(self):
+        client = FakeClient()
+        progress = Progress(client, stream=io.StringIO())
+
+        progress.Fetching(4)
+        progress.Fetched()
+        progress.Planned()
+        progress.Planned()
+
+        self.assertEqual(
+            progress.Status(),
+            'repos 1/4 | 0.0 pages/s | actions 0/2 | 3 in flight | budget 4200 | ETA 0s')
+
+    def test_status_relabelling(self):
+        client = FakeClient()
+        progress = Progress(client, stream=io.StringIO())
+
+        progress.Fetching(1)
+        progress.Fetched()
+        progress.Planned()
+        progress.Relabelling(4)
+        progress.SynonymFetched()
+
+        self.assertEqual(
+            progress.Status(),
+            'repos 1/1 | 0.0 pages/s | actions 0/1 | relabel 1/4 synonyms, 0/0 items | '
+            '3 in flight | budget 4200 | ETA 0s')
+
+        for _ in range(3):
+            progress.SynonymFetched()
+        progress.Labelling(100)
+        progress.Labelled(50)
+
+        self.assertEqual(
+            progress.Status(),
+            'repos 1/1 | 0.0 pages/s | actions 0/1 | relabel 4/4 synonyms, 50/100 items | '
+            '3 in flight | budget 4200 | ETA 0s')
+
+    def test_logs_periodically_when_not_a_tty(self):
+        stream = io.StringIO()
+        progress = Progress(FakeClient(), stream=stream, interval=0.01)
+
+        progress.Start()
+        time.sleep(0.1)
+        progress.Stop()
+
+        lines = stream.getvalue().splitlines()
+        self.assertGreater(len(lines), 1)
+        self.assertIn(' progress: repos 0/0 | ', lines[0])
+
+    def test_output_pauses_until_executed(self):
+        progress = Progress(FakeClient(), stream=io.StringIO())
+        output = FakeOutput()
+        out = ProgressOutput(output, progress)
+
+        out.Planning('test_org', ['test_repo_1'])
+        out.Fetching('test_org', 'test_repo_1')
+        out.Fetched('test_org', None)
+        out.Planned(None)
+        out.Executing(None)
+
+        self.assertEqual(progress.paused, 1)
+
+        out.Executed(None, 'ok')
+
+        self.assertEqual(progress.paused, 0)
+        self.assertEqual(
+            output.calls, ['Planning', 'Fetched', 'Planned', 'Executing', 'Executed'])
+        self.assertEqual(
+            (progress.repos_fetched, progress.actions, progress.actions_executed),
+            (1, 1, 1))
@@ -0,0 +1,228 @@
+import hashlib
+import threading
+
+from gql import gql
+from graphql import print_ast
+
+USER = '''
+    query User {
+      viewer {
+        login
+      }
+    }
+'''
+
+REPOSITORY_LABELS = '''
+    query RepositoryLabels (
+      $owner: String!,
+      $name: String!,
+      $labels_first: Int!,
+      $labels_after: String) {
+      rateLimit {
+        cost
+      }
+      repository(owner: $owner, name: $name) {
+        id,
+        name,
+        labels(first: $labels_first, after: $labels_after) {
+          nodes {
+            id,
+            name,
+            color,
+            description
+          },
+          pageInfo {
+            hasNextPage,
+            endCursor
+          }
+        }
+      }
+    }
+'''
+
+REPOSITORY_ISSUES = '''
+    query RepositoryIssues (
+      $owner: String!,
+      $name: String!,
+      $issues_first: Int!,
+      $issue_labels_first: Int!,
+      $issue_filter: IssueFilters,
+      $issues_after: String) {
+      rateLimit {
+        cost
+      }
+      repository(owner: $owner, name: $name) {
+        issues(
+            first: $issues_first,
+            after: $issues_after,
+            filterBy: $issue_filter) {
+          nodes {
+            id,
+            title,
+            labels(first: $issue_labels_first) {
+              nodes {
+                id
+              },
+              pageInfo {
+                hasNextPage
+              }
+            }
+          },
+          pageInfo {
+            hasNextPage,
+            endCursor
+          }
+        }
+      }
+    }
+'''
+
+LABEL_LABELABLES = '''
+    query LabelLabelables (
+      $owner: String!,
+      $name: String!,
+      $label: String!,
+      $include_issues: Boolean!,
+      $issues_first: Int!,
+      $issues_after: String,
+      $issue_filter: IssueFilters,
+      $include_pull_requests: Boolean!,
+      $pull_requests_first: Int!,
+      $pull_requests_after: String,
+      $pull_request_states: [PullRequestState!]) {
+      rateLimit {
+        cost
+      }
+      repository(owner: $owner, name: $name) {
+        label(name: $label) {
+          issues(
+              first: $issues_first,
+              after: $issues_after,
+              filterBy: $issue_filter) @include(if: $include_issues) {
+            nodes {
+              id
+            },
+            pageInfo {
+              hasNextPage,
+              endCursor
+            }
+          }
+          pullRequests(
+              first: $pull_requests_first,
+              after: $pull_requests_after,
+              states: $pull_request_states,
+              orderBy: {field: UPDATED_AT, direction: DESC}) @include(if: $include_pull_requests) {
+            nodes {
+              id,
+              updatedAt
+            },
+            pageInfo {
+              hasNextPage,
+              endCursor
+            }
+          }
+        }
+      }
+    }
+'''
+
+class Query:
+    """ A parsed GraphQL document with its canonical text and sha256 hash.
+
+        The hash identifies the document to servers supporting persisted
+        queries, which can then be sent without the text.
+    """
+    def __init__(self, source: str):
+        self.document = gql(source)
+        self.text = print_ast(documentNode(self.document))
+        self.hash = hashlib.sha256(self.text.encode('utf-8')).hexdigest()
+        self.name = None
+
+        for definition in documentNode(self.document).definitions:
+            if getattr(definition, 'name', None):
+                self.name = definition.name.value
+                break
+
+    def __repr__(self):
+        return 'Query<{}>'.format(repr(self.name))
+
+
+queries = {}
+queries_lock = threading.Lock()
+
+def Get(name: str, variant=None, source=None) -> Query:
+    """ Returns the parsed query for an operation name and variant.
+
+        Each query is parsed once and reused by later calls.
+
+        Args:
+          name: The name of the operation.
+          variant: Distinguishes generated documents with the same operation
+            name, eg. the number of fields in a batch.
+          source: Returns the text of the document.  Only called the first time
+            a name and variant is requested.
+    """
+    key = (name, variant)
+
+    with queries_lock:
+        if key not in queries:
+            queries[key] = Query(source())
+
+        return queries[key]
+
+
+def User() -> Query:
+    return Get('User', source=lambda: USER)
+
+
+def RepositoryLabels() -> Query:
+    return Get('RepositoryLabels', source=lambda: REPOSITORY_LABELS)
+
+
+def RepositoryIssues() -> Query:
+    return Get('RepositoryIssues', source=lambda: REPOSITORY_ISSUES)
+
+
+def LabelLabelables() -> Query:
+    return Get('LabelLabelables', source=lambda: LABEL_LABELABLES)
+
+
+def LabelIssueCounts(size: int) -> Query:
+    """ Returns a query for the issue and pull request counts of size labels,
+        named $l0, $l1...
+    """
+    def source() -> str:
+        variables = ''.join('$l{}: String!, '.format(n) for n in range(size))
+        fields = '\n'.join(
+            'l{0}: label(name: $l{0}) {{ issues(filterBy: $issue_filter) '
+            '{{ totalCount }} pullRequests(states: $pull_request_states) '
+            '{{ totalCount }} }}'.format(n) for n in range(size))
+
+        return (
+            'query LabelIssueCounts($owner: String!, $name: String!, {}'
+            '$issue_filter: IssueFilters, '
+            '$pull_request_states: [PullRequestState!]) {{\n'
+            'repository(owner: $owner, name: $name) {{\n{}\n}}\n}}'.format(
+                variables, fields))
+
+    return Get('LabelIssueCounts', size, source)
+
+
+def Batch(name: str, field: str, input_type: str, selection: str, size: int) -> Query:
+    """ Returns a mutation of size aliased fields, with inputs $i0, $i1... """
+    def source() -> str:
+        variables = ', '.join(
+            '$i{}: {}!'.format(n, input_type) for n in range(size))
+        fields = '\n'.join(
+            'm{}: {}(input: $i{}) {{ {} }}'.format(n, field, n, selection)
+            for n in range(size))
+
+        return 'mutation {}({}) {{\n{}\n}}'.format(name, variables, fields)
+
+    return Get(name, (field, input_type, selection, size), source)
+
+
+def documentNode(document):
+    """ Returns the DocumentNode of a document returned by gql(). """
+    # gql 4 wraps the parsed document in a GraphQLRequest.
+    return getattr(document, 'document', document)
@@ -0,0 +1,44 @@
+import hashlib
+import unittest
+
+import ghadm.queries as queries
+from ghadm.client import isPersistedQueryNotFound
+
+class TestQueries(unittest.TestCase):
+
+    def test_get_parses_once(self):
+        sources = []
+
+        def source():
+            sources.append(1)
+            return 'query TestGetParsesOnce { viewer { login } }'
+
+        first = queries.Get('TestGetParsesOnce', source=source)
+        second = queries.Get('TestGetParsesOnce', source=source)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(sources), 1)
+        self.assertEqual(first.name, 'TestGetParsesOnce')
+
+    def test_batch_variants(self):
+        one = queries.Batch('DeleteLabels', 'deleteLabel', 'DeleteLabelInput', 'clientMutationId', 1)
+        two = queries.Batch('DeleteLabels', 'deleteLabel', 'DeleteLabelInput', 'clientMutationId', 2)
+
+        self.assertIsNot(one, two)
+        self.assertIs(
+            two,
+            queries.Batch('DeleteLabels', 'deleteLabel', 'DeleteLabelInput', 'clientMutationId', 2))
+        self.assertIn('m1: deleteLabel(input: $i1)', two.text)
+        self.assertNotIn('m1:', one.text)
+
+    def test_hash(self):
+        query = queries.User()
+
+        self.assertEqual(query.hash, hashlib.sha256(query.text.encode('utf-8')).hexdigest())
+
+    def test_persisted_query_not_found(self):
+        self.assertTrue(isPersistedQueryNotFound(
+            {'errors': [{'message': 'PersistedQueryNotFound'}]}))
+        self.assertTrue(isPersistedQueryNotFound(
+            {'errors': [{'message': '', 'extensions': {'code': 'PERSISTED_QUERY_NOT_FOUND'}}]}))
+        self.assertFalse(isPersistedQueryNotFound({'data': {}}))
@@ -0,0 +1,214 @@
+import collections
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from ghadm.client import Label, Repository
+from ghadm.paging import PAGE_RETRIES
+from ghadm.tokens import TokenPool
+
+REST_PAGE_SIZE = 100
+
+# Seconds allowed per request, unless configured by the RestLabels or default
+# timeouts.
+REST_TIMEOUT = 60
+
+LINK_NEXT = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+class RestLabelFetcher:
+    """ Fetches repository labels from the REST API using conditional requests.
+
+        An ETag is stored for each repository and for each page of labels
+        alongside the cached label data.  Requests are sent with If-None-Match
+        so unchanged repositories are answered with 304 Not Modified, which
+        does not count against the rate limit.
+
+        The REST rate limit is separate from the GraphQL rate limit, so pool
+        should be derived from the Client's pool with TokenPool.Derive.  Rate
+        limited tokens are parked until their reset time.
+
+        Requests which exceed timeout are counted and retried, up to
+        PAGE_RETRIES attempts.
+
+        Repositories may be fetched concurrently from several threads.  The
+        cache is saved by Close.
+    """
+    def __init__(
+            self,
+            endpoint: str,
+            pool: TokenPool,
+            cache_path: str,
+            timeout: float = REST_TIMEOUT):
+        self.endpoint = endpoint.rstrip('/')
+        self.pool = pool
+        self.timeout = timeout
+        self.cache_path = os.path.expanduser(cache_path)
+        self.cache = self.loadCache()
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    def Close(self):
+        self.saveCache()
+
+    def Stats(self) -> collections.Counter:
+        """ Returns a copy of the request statistics, eg. 'pages' and
+            'timeouts'.
+        """
+        with self.lock:
+            return collections.Counter(self.stats)
+
+    def Repository(self, org: str, repo: str) -> Repository:
+        """ Returns a Repository with all labels and no issues. """
+        with self.lock:
+            entry = self.cache.setdefault(
+                '{}/{}'.format(org, repo), {'repository': {}, 'pages': {}})
+
+        url = '{}/repos/{}/{}'.format(self.endpoint, org, repo)
+        (status, body, headers) = self.get(url, entry['repository'].get('etag'))
+        if status != 304:
+            entry['repository'] = {
+                'etag': headers.get('ETag'),
+                'id': body['node_id'],
+                'name': body['name']
+            }
+
+        nodes = []
+        pages = {}
+        first_url = '{}/labels?per_page={}'.format(url, REST_PAGE_SIZE)
+        url = first_url
+        while url:
+            page = entry['pages'].get(url, {})
+            (status, body, headers) = self.get(url, page.get('etag'))
+            if status != 304:
+                page = {
+                    'etag': headers.get('ETag'),
+                    'labels': [labelNode(l) for l in body],
+                    'next': nextLink(headers)
+                }
+            elif nextLink(headers):
+                # ETags cover the labels of a page but not its Link header.
+                page = dict(page, next=nextLink(headers))
+            elif not page['next'] and len(page['labels']) >= REST_PAGE_SIZE:
+                # Labels added after a full last page are on a new page.
+                page = dict(page, next='{}&page={}'.format(first_url, len(pages) + 2))
+
+            pages[url] = page
+            nodes += page['labels']
+            url = page['next']
+
+            with self.lock:
+                self.stats['pages'] += 1
+
+        # Only keep pages which are still part of the listing.
+        entry['pages'] = pages
+
+        return Repository(
+            entry['repository']['id'],
+            entry['repository']['name'],
+            Label.DictFromNodes(nodes),
+            {},
+            [])
+
+    def get(self, url: str, etag: str) -> tuple[int, object, dict]:
+        """ Sends a GET request, conditional on etag if one is given.
+
+            Returns the status, the decoded body (None for 304) and the headers.
+            Requests which are rate limited park their token until its reset
+            time and are retried with another token.  Requests which time out
+            are retried, raising TimeoutError after PAGE_RETRIES attempts.
+        """
+        attempts = 0
+        while True:
+            token = self.pool.Acquire()
+            try:
+                headers = {
+                    'Authorization': 'Bearer ' + token.Value(),
+                    'Accept': 'application/vnd.github+json'
+                }
+                if etag:
+                    headers['If-None-Match'] = etag
+
+                request = urllib.request.Request(url, headers=headers)
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    self.pool.Update(token, response.headers)
+                    return (response.status, json.load(response), response.headers)
+            except urllib.error.HTTPError as e:
+                self.pool.Update(token, e.headers)
+                if e.code == 304 and etag:
+                    return (304, None, e.headers)
+                if not isRateLimited(e):
+                    raise
+
+                self.pool.Park(token, resetAt(e.headers))
+            except (TimeoutError, urllib.error.URLError) as e:
+                if not isTimeout(e):
+                    raise
+
+                with self.lock:
+                    self.stats['timeouts'] += 1
+
+                attempts += 1
+                if attempts == PAGE_RETRIES:
+                    raise TimeoutError('Request timed out: {}'.format(url)) from e
+
+    def loadCache(self) -> dict:
+        try:
+            with open(self.cache_path, 'r') as stream:
+                return json.load(stream)
+        except (OSError, ValueError):
+            return {}
+
+    def saveCache(self):
+        tmp_path = self.cache_path + '.tmp'
+        with self.lock:
+            with open(tmp_path, 'w') as stream:
+                json.dump(self.cache, stream)
+            os.replace(tmp_path, self.cache_path)
+
+
+def isTimeout(e: Exception) -> bool:
+    """ Returns whether e was raised by a request exceeding its timeout. """
+    if isinstance(e, urllib.error.URLError):
+        return isinstance(e.reason, TimeoutError)
+
+    return isinstance(e, TimeoutError)
+
+
+def isRateLimited(e: urllib.error.HTTPError) -> bool:
+    """ Returns whether e was caused by the token's budget being exhausted. """
+    if e.code not in (403, 429) or not e.headers:
+        return False
+
+    return (e.headers.get('X-RateLimit-Remaining') == '0' or
+            e.headers.get('Retry-After') is not None)
+
+
+def resetAt(headers) -> float:
+    """ Returns when a rate limited token may be used again. """
+    if headers.get('Retry-After'):
+        return time.time() + float(headers['Retry-After'])
+
+    return float(headers.get('X-RateLimit-Reset', 0))
+
+
+def labelNode(label: dict) -> dict:
+    """ Converts a REST label into the shape of a GraphQL label node. """
+    return {
+        'id': label['node_id'],
+        'name': label['name'],
+        'color': label['color'],
+        'description': label.get('description')
+    }
+
+
+def nextLink(headers) -> str:
+    """ Returns the rel="next" URL from a Link header, if any. """
+    match = LINK_NEXT.search(headers.get('Link') or '')
+    if match:
+        return match.group(1)
+
+    return None
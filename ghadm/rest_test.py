@@ -0,0 +1,255 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import urllib.error
+from unittest import mock
+
+from ghadm.client import Label
+from ghadm.paging import PAGE_RETRIES
+from ghadm.rest import RestLabelFetcher, nextLink
+from ghadm.tokens import Token, TokenPool
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, body, headers: dict):
+        super().__init__(json.dumps(body).encode())
+        self.status = 200
+        self.headers = headers
+
+
+class RateLimited(urllib.error.HTTPError):
+    """ A 403 response for an exhausted token. """
+    def __init__(self, url: str):
+        super().__init__(
+            url, 403, 'Forbidden',
+            {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '4102444800'}, None)
+
+
+class TestRestLabelFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.dir.name, 'cache.json')
+        self.requests = []
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_next_link(self):
+        headers = {
+            'Link': '<https://x/labels?page=2>; rel="next", '
+                    '<https://x/labels?page=5>; rel="last"'
+        }
+        self.assertEqual(nextLink(headers), 'https://x/labels?page=2')
+
+    def test_next_link_missing(self):
+        self.assertEqual(nextLink({}), None)
+
+    def test_repository_pages(self):
+        responses = {
+            'https://x/repos/org/repo': self.create_test_repo_response(),
+            'https://x/repos/org/repo/labels?per_page=100': FakeResponse(
+                [self.create_test_rest_label('1')],
+                {'ETag': 'page_1', 'Link': '<https://x/page2>; rel="next"'}),
+            'https://x/page2': FakeResponse(
+                [self.create_test_rest_label('2')],
+                {'ETag': 'page_2'})
+        }
+
+        with mock.patch('urllib.request.urlopen', self.fake_urlopen(responses)):
+            repo = self.create_test_fetcher().Repository('org', 'repo')
+
+        self.assertEqual(repo.id, 'test_repo_id')
+        self.assertEqual(repo.name, 'repo')
+        self.assertEqual(repo.labels, {
+            'test_id_1': self.create_test_label('1'),
+            'test_id_2': self.create_test_label('2')})
+
+    def test_repository_not_modified(self):
+        responses = {
+            'https://x/repos/org/repo': self.create_test_repo_response(),
+            'https://x/repos/org/repo/labels?per_page=100': FakeResponse(
+                [self.create_test_rest_label('1')], {'ETag': 'page_1'})
+        }
+
+        with mock.patch('urllib.request.urlopen', self.fake_urlopen(responses)):
+            fetcher = self.create_test_fetcher()
+            first = fetcher.Repository('org', 'repo')
+            fetcher.Close()
+
+        self.requests = []
+        with mock.patch('urllib.request.urlopen', self.fake_urlopen({})):
+            second = self.create_test_fetcher().Repository('org', 'repo')
+
+        self.assertEqual(first, second)
+        self.assertEqual(
+            [r.get_header('If-none-match') for r in self.requests],
+            ['repo_etag', 'page_1'])
+
+    def test_repository_not_modified_full_last_page(self):
+        responses = {
+            'https://x/repos/org/repo': self.create_test_repo_response(),
+            'https://x/repos/org/repo/labels?per_page=1': FakeResponse(
+                [self.create_test_rest_label('1')], {'ETag': 'page_1'})
+        }
+
+        with mock.patch('ghadm.rest.REST_PAGE_SIZE', 1):
+            with mock.patch('urllib.request.urlopen', self.fake_urlopen(responses)):
+                fetcher = self.create_test_fetcher()
+                fetcher.Repository('org', 'repo')
+                fetcher.Close()
+
+            # The first page is unchanged, but a label was added after it.
+            responses = {
+                'https://x/repos/org/repo/labels?per_page=1&page=2': FakeResponse(
+                    [self.create_test_rest_label('2')], {'ETag': 'page_2'})
+            }
+            self.requests = []
+            with mock.patch('urllib.request.urlopen', self.fake_urlopen(responses)):
+                repo = self.create_test_fetcher().Repository('org', 'repo')
+
+        self.assertEqual(repo.labels, {
+            'test_id_1': self.create_test_label('1'),
+            'test_id_2': self.create_test_label('2')})
+        self.assertEqual(
+            [r.full_url for r in self.requests],
+            [
+                'https://x/repos/org/repo',
+                'https://x/repos/org/repo/labels?per_page=1',
+                'https://x/repos/org/repo/labels?per_page=1&page=2'
+            ])
+
+    def test_repository_not_modified_next_link(self):
+        responses = {
+            'https://x/repos/org/repo': self.create_test_repo_response(),
+            'https://x/repos/org/repo/labels?per_page=100': FakeResponse(
+                [self.create_test_rest_label('1')], {'ETag': 'page_1'})
+        }
+
+        with mock.patch('urllib.request.urlopen', self.fake_urlopen(responses)):
+            fetcher = self.create_test_fetcher()
+            fetcher.Repository('org', 'repo')
+            fetcher.Close()
+
+        responses = {'https://x/page2': FakeResponse([self.create_test_rest_label('2')], {})}
+        not_modified_headers = {'Link': '<https://x/page2>; rel="next"'}
+        with mock.patch(
+                'urllib.request.urlopen',
+                self.fake_urlopen(responses, not_modified_headers)):
+            repo = self.create_test_fetcher().Repository('org', 'repo')
+
+        self.assertIn('test_id_2', repo.labels)
+
+    def test_repository_counts_pages(self):
+        responses = {
+            'https://x/repos/org/repo': self.create_test_repo_response(),
+            'https://x/repos/org/repo/labels?per_page=100': FakeResponse(
+                [self.create_test_rest_label('1')],
+                {'ETag': 'page_1', 'Link': '<https://x/page2>; rel="next"'}),
+            'https://x/page2': FakeResponse(
+                [self.create_test_rest_label('2')],
+                {'ETag': 'page_2', 'X-RateLimit-Remaining': '4000'})
+        }
+
+        token = Token('test_token')
+        fetcher = RestLabelFetcher('https://x/', TokenPool([token]), self.cache_path)
+        with mock.patch('urllib.request.urlopen', self.fake_urlopen(responses)):
+            fetcher.Repository('org', 'repo')
+
+        self.assertEqual(fetcher.Stats()['pages'], 2)
+        self.assertEqual(token.remaining, 4000)
+
+    def test_rate_limited_token_parked(self):
+        responses = {
+            'https://x/repos/org/repo': self.create_test_repo_response(),
+            'https://x/repos/org/repo/labels?per_page=100': FakeResponse([], {})
+        }
+
+        limited = Token('test_token_1')
+        available = Token('test_token_2')
+        fetcher = RestLabelFetcher(
+            'https://x/', TokenPool([limited, available]), self.cache_path)
+
+        def urlopen(request, timeout=None):
+            self.requests.append(request)
+            if request.get_header('Authorization') == 'Bearer test_token_1':
+                raise RateLimited(request.full_url)
+            return responses[request.full_url]
+
+        with mock.patch('urllib.request.urlopen', urlopen):
+            repo = fetcher.Repository('org', 'repo')
+
+        self.assertEqual(repo.id, 'test_repo_id')
+        self.assertEqual(limited.remaining, 0)
+        self.assertEqual(limited.reset_at, 4102444800.0)
+        self.assertEqual(
+            [r.get_header('Authorization') for r in self.requests],
+            ['Bearer test_token_1', 'Bearer test_token_2', 'Bearer test_token_2'])
+
+    def test_timeout_retried_and_counted(self):
+        responses = {
+            'https://x/repos/org/repo': self.create_test_repo_response(),
+            'https://x/repos/org/repo/labels?per_page=100': FakeResponse([], {})
+        }
+        timeouts = []
+
+        def urlopen(request, timeout=None):
+            timeouts.append(timeout)
+            if len(timeouts) == 1:
+                raise urllib.error.URLError(TimeoutError('timed out'))
+            return responses[request.full_url]
+
+        fetcher = RestLabelFetcher(
+            'https://x/', TokenPool([Token('test_token')]), self.cache_path, timeout=5)
+        with mock.patch('urllib.request.urlopen', urlopen):
+            repo = fetcher.Repository('org', 'repo')
+
+        self.assertEqual(repo.id, 'test_repo_id')
+        self.assertEqual(timeouts, [5, 5, 5])
+        self.assertEqual(fetcher.Stats()['timeouts'], 1)
+
+    def test_timeout_raised_after_retries(self):
+        def urlopen(request, timeout=None):
+            raise TimeoutError('timed out')
+
+        fetcher = self.create_test_fetcher()
+        with mock.patch('urllib.request.urlopen', urlopen):
+            with self.assertRaises(TimeoutError):
+                fetcher.Repository('org', 'repo')
+
+        self.assertEqual(fetcher.Stats()['timeouts'], PAGE_RETRIES)
+
+    def fake_urlopen(self, responses: dict, not_modified_headers: dict = None):
+        def urlopen(request, timeout=None):
+            self.requests.append(request)
+            if request.full_url not in responses:
+                raise urllib.error.HTTPError(
+                    request.full_url, 304, 'Not Modified', not_modified_headers or {}, None)
+            return responses[request.full_url]
+
+        return urlopen
+
+    def create_test_fetcher(self):
+        return RestLabelFetcher(
+            'https://x/', TokenPool([Token('test_token')]), self.cache_path)
+
+    def create_test_repo_response(self):
+        return FakeResponse(
+            {'node_id': 'test_repo_id', 'name': 'repo'}, {'ETag': 'repo_etag'})
+
+    def create_test_rest_label(self, ordinal: str):
+        return {
+            'id': int(ordinal),
+            'node_id': 'test_id_{}'.format(ordinal),
+            'name': 'test_label_{}'.format(ordinal),
+            'color': 'test_color_{}'.format(ordinal),
+            'description': 'test_description_{}'.format(ordinal)
+        }
+
+    def create_test_label(self, ordinal: str):
+        return Label(
+            'test_id_{}'.format(ordinal),
+            'test_label_{}'.format(ordinal),
+            'test_description_{}'.format(ordinal),
+            'test_color_{}'.format(ordinal))
@@ -0,0 +1,215 @@
+import datetime
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+try:
+    import jwt
+except ImportError:
+    jwt = None
+
+# Installation tokens are re-minted this many seconds before they expire.
+TOKEN_EXPIRY_MARGIN = 300
+
+# Seconds to park a rate limited token whose reset time is unknown.
+PARK_DEFAULT = 60
+
+# Seconds allowed to mint an installation token, unless configured by the
+# AppInstallationToken or default timeouts.
+MINT_TIMEOUT = 60
+
+class MissingDependency(Exception):
+    pass
+
+
+class Token:
+    """ A personal access token and the rate limit budget last seen for it. """
+    def __init__(self, value: str):
+        self.value = value
+        self.remaining = None
+        self.reset_at = 0.0
+
+    def __repr__(self):
+        return 'Token<{}, {}>'.format(repr(self.remaining), repr(self.reset_at))
+
+    def Value(self) -> str:
+        return self.value
+
+
+class SharedToken(Token):
+    """ The value of another token with a separate rate limit budget, eg. for
+        the REST API whose rate limit is separate from the GraphQL API.
+    """
+    def __init__(self, token: Token):
+        super().__init__(None)
+        self.token = token
+
+    def __repr__(self):
+        return 'SharedToken<{}, {}>'.format(repr(self.remaining), repr(self.reset_at))
+
+    def Value(self) -> str:
+        return self.token.Value()
+
+
+class AppInstallationToken(Token):
+    """ An installation token minted for a GitHub App from its private key.
+
+        The token is minted on first use and re-minted shortly before it
+        expires.  Concurrent requests wait for a single mint.
+    """
+    def __init__(
+            self,
+            rest_endpoint: str,
+            app_id: str,
+            installation_id: str,
+            private_key: str,
+            timeout: float = MINT_TIMEOUT):
+        super().__init__(None)
+        self.rest_endpoint = rest_endpoint.rstrip('/')
+        self.app_id = app_id
+        self.installation_id = installation_id
+        self.private_key = private_key
+        self.timeout = timeout
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+
+    def Value(self) -> str:
+        with self.lock:
+            if time.time() > self.expires_at - TOKEN_EXPIRY_MARGIN:
+                self.mint()
+
+            return self.value
+
+    def mint(self):
+        if jwt is None:
+            raise MissingDependency(
+                'GitHub App tokens require PyJWT: pip install "PyJWT[crypto]"')
+
+        now = int(time.time())
+        app_jwt = jwt.encode(
+            {'iat': now - 60, 'exp': now + 540, 'iss': str(self.app_id)},
+            self.private_key,
+            algorithm='RS256')
+
+        request = urllib.request.Request(
+            '{}/app/installations/{}/access_tokens'.format(
+                self.rest_endpoint, self.installation_id),
+            method='POST',
+            headers={
+                'Authorization': 'Bearer ' + app_jwt,
+                'Accept': 'application/vnd.github+json'
+            })
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.load(response)
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, TimeoutError):
+                raise TimeoutError('Minting an installation token timed out') from e
+            raise
+
+        self.value = body['token']
+        self.expires_at = datetime.datetime.fromisoformat(
+            body['expires_at'].replace('Z', '+00:00')).timestamp()
+
+
+class TokenPool:
+    """ Spreads requests across tokens according to their remaining budget.
+
+        Each request should Acquire a token and then Update the pool with the
+        response headers.  Tokens whose budget is exhausted are parked until
+        their reset time.
+    """
+    def __init__(self, tokens: list[Token]):
+        if not tokens:
+            raise ValueError('TokenPool requires at least one token')
+
+        self.tokens = tokens
+        self.lock = threading.Lock()
+
+    def Acquire(self) -> Token:
+        """ Returns the available token with the largest remaining budget.
+
+            Tokens which have not been used yet are preferred.  Blocks until
+            the earliest reset if every token is parked.
+        """
+        while True:
+            with self.lock:
+                now = time.time()
+                available = [
+                    t for t in self.tokens if t.remaining != 0 or t.reset_at <= now]
+
+                if available:
+                    token = max(available, key=budget)
+                    if token.remaining:
+                        # Reserve a point so concurrent callers spread out.
+                        token.remaining -= 1
+                    return token
+
+                wait = min(t.reset_at for t in self.tokens) - now
+
+            time.sleep(max(wait, 0) + 1)
+
+    def Update(self, token: Token, headers):
+        """ Records the budget reported by the X-RateLimit response headers. """
+        if not headers or 'X-RateLimit-Remaining' not in headers:
+            return
+
+        with self.lock:
+            token.remaining = int(headers['X-RateLimit-Remaining'])
+            token.reset_at = float(headers.get('X-RateLimit-Reset', 0))
+
+    def Park(self, token: Token, reset_at: float):
+        """ Marks token as exhausted until reset_at.
+
+            If reset_at is unknown or already past the token is parked for
+            PARK_DEFAULT seconds.
+        """
+        with self.lock:
+            now = time.time()
+            token.remaining = 0
+            token.reset_at = reset_at if reset_at > now else now + PARK_DEFAULT
+
+    def Remaining(self) -> int:
+        """ Returns the total known remaining budget across all tokens. """
+        with self.lock:
+            return sum(t.remaining or 0 for t in self.tokens)
+
+    def Derive(self) -> 'TokenPool':
+        """ Returns a pool of the same tokens with separate budgets. """
+        return TokenPool([SharedToken(t) for t in self.tokens])
+
+
+def budget(token: Token) -> float:
+    if token.remaining is None:
+        return float('inf')
+
+    return token.remaining
+
+
+def PoolFromConfig(config: dict) -> TokenPool:
+    """ Builds a TokenPool from the access tokens and apps in config. """
+    tokens = []
+    timeouts = config.get('timeouts') or {}
+    timeout = timeouts.get('AppInstallationToken', timeouts.get('default', MINT_TIMEOUT))
+
+    if config.get('access_token'):
+        tokens.append(Token(config['access_token']))
+
+    for value in config.get('access_tokens', []):
+        tokens.append(Token(value))
+
+    for app in config.get('github_apps', []):
+        with open(os.path.expanduser(app['private_key']), 'r') as stream:
+            private_key = stream.read()
+
+        tokens.append(AppInstallationToken(
+            config.get('rest_endpoint', 'https://api.github.com'),
+            app['app_id'],
+            app['installation_id'],
+            private_key,
+            timeout))
+
+    return TokenPool(tokens)
@@ -0,0 +1,132 @@
+import threading
+import time
+import unittest
+import urllib.error
+from unittest import mock
+
+from ghadm.tokens import AppInstallationToken, Token, TokenPool, PoolFromConfig
+
+class TestTokenPool(unittest.TestCase):
+
+    def test_acquire_prefers_unused_token(self):
+        used = self.create_test_token('1', remaining=10)
+        unused = self.create_test_token('2')
+
+        pool = TokenPool([used, unused])
+
+        self.assertIs(pool.Acquire(), unused)
+
+    def test_acquire_largest_remaining(self):
+        low = self.create_test_token('1', remaining=10)
+        high = self.create_test_token('2', remaining=4000)
+
+        pool = TokenPool([low, high])
+
+        self.assertIs(pool.Acquire(), high)
+        self.assertEqual(high.remaining, 3999)
+
+    def test_acquire_skips_parked_token(self):
+        parked = self.create_test_token('1', remaining=4000)
+        available = self.create_test_token('2', remaining=10)
+
+        pool = TokenPool([parked, available])
+        pool.Park(parked, time.time() + 3600)
+
+        self.assertIs(pool.Acquire(), available)
+
+    def test_acquire_after_reset(self):
+        token = self.create_test_token('1')
+
+        pool = TokenPool([token])
+        pool.Park(token, time.time() + 3600)
+        token.reset_at = time.time() - 1
+
+        self.assertIs(pool.Acquire(), token)
+
+    def test_update_from_headers(self):
+        token = self.create_test_token('1')
+
+        pool = TokenPool([token])
+        pool.Update(token, {'X-RateLimit-Remaining': '42', 'X-RateLimit-Reset': '1000'})
+
+        self.assertEqual(token.remaining, 42)
+        self.assertEqual(token.reset_at, 1000.0)
+        self.assertEqual(pool.Remaining(), 42)
+
+    def test_derive_separate_budgets(self):
+        token = self.create_test_token('1', remaining=10)
+
+        pool = TokenPool([token])
+        derived = pool.Derive()
+        shared = derived.Acquire()
+
+        self.assertEqual(shared.Value(), token.Value())
+        self.assertEqual(shared.remaining, None)
+        self.assertEqual(token.remaining, 10)
+
+    def test_update_without_headers(self):
+        token = self.create_test_token('1', remaining=7)
+
+        pool = TokenPool([token])
+        pool.Update(token, None)
+
+        self.assertEqual(token.remaining, 7)
+
+    def test_pool_from_config(self):
+        pool = PoolFromConfig({
+            'access_token': 'test_token_1',
+            'access_tokens': ['test_token_2', 'test_token_3']
+        })
+
+        self.assertEqual(
+            [t.Value() for t in pool.tokens],
+            ['test_token_1', 'test_token_2', 'test_token_3'])
+
+    def test_pool_from_config_empty(self):
+        with self.assertRaises(ValueError):
+            PoolFromConfig({})
+
+    def create_test_token(self, ordinal: str, remaining: int = None):
+        token = Token('test_token_{}'.format(ordinal))
+        token.remaining = remaining
+        return token
+
+
+class TestAppInstallationToken(unittest.TestCase):
+
+    def test_value_minted_once_concurrently(self):
+        token = AppInstallationToken('https://x/', '1', '2', 'test_key')
+        mints = []
+
+        def mint():
+            mints.append(threading.current_thread())
+            time.sleep(0.05)
+            token.value = 'test_token'
+            token.expires_at = time.time() + 3600
+
+        with mock.patch.object(token, 'mint', mint):
+            threads = [
+                threading.Thread(target=token.Value) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(mints), 1)
+        self.assertEqual(token.Value(), 'test_token')
+
+    def test_mint_timeout(self):
+        token = AppInstallationToken('https://x/', '1', '2', 'test_key', timeout=5)
+        timeouts = []
+
+        def urlopen(request, timeout=None):
+            timeouts.append(timeout)
+            raise urllib.error.URLError(TimeoutError('timed out'))
+
+        with mock.patch('ghadm.tokens.jwt') as jwt:
+            jwt.encode.return_value = 'test_jwt'
+            with mock.patch('urllib.request.urlopen', urlopen):
+                with self.assertRaises(TimeoutError):
+                    token.Value()
+
+        self.assertEqual(timeouts, [5])
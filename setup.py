@@ -5,6 +5,9 @@ setup(
     name='ghadm',
     version='0.1',
     packages=find_packages(),
+    extras_require={
+        'apps': ['PyJWT[crypto]'],
+    },
     entry_points = {
         'console_scripts': ['ghadm=ghadm.command:main'],
     }